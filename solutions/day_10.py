@@ -1,214 +1,111 @@
-from itertools import chain
-from typing import Dict
+from typing import Iterable
 from typing import List
 from typing import Optional
 from typing import Tuple
-from typing import Union
 
 import matplotlib.pyplot as plt
 import numpy as np
-from scipy import ndimage
-from scipy.ndimage import binary_dilation
 
-symbols = ["|", "L", "J", "F", "-", ".", "Z"]  # 7 replaced with Z to avoid confusion with incrementing path
+NORTH, EAST, SOUTH, WEST = 1, 2, 4, 8
+PIPES = {
+    "|": NORTH | SOUTH,
+    "-": EAST | WEST,
+    "L": NORTH | EAST,
+    "J": NORTH | WEST,
+    "7": SOUTH | WEST,
+    "F": SOUTH | EAST,
+}
+MOVES = {NORTH: (-1, 0), EAST: (0, 1), SOUTH: (1, 0), WEST: (0, -1)}
+OPPOSITE = {NORTH: SOUTH, EAST: WEST, SOUTH: NORTH, WEST: EAST}
 
 
-def numerify(arr: np.ndarray) -> np.ndarray:
+def encode_map(data: List[str]) -> Tuple[np.ndarray, Tuple[int, int]]:
     """
-    Convert an array of strings to numbers according to the rule: 0 if in symbols, 1 if a number
-    :param arr: input array
-    :return: numeric array
-    """
-    mask = np.isin(arr, symbols)
-    map_arr = np.where(mask, "0", arr)
-    map_arr = map_arr.astype("uint16")  # uint16 to allow for n > 255
-    return map_arr
-
-
-def gen_fig(arr: np.ndarray) -> None:
-    """
-    Generate an image to show the path from the array map
-    :param arr: input array of symbols
-    :return: void
-    """
-    plt.imshow(numerify(arr))
-
-
-def check_symbol(symbol: str, direction: str, current_idx: str) -> bool:
-    """
-    Check to see if a symbol found in the map is valid for a given direction
-    :param symbol: the entry at the proposed next position
-    :param direction: the direction from current position
-    :param current_idx: the entry at current position in the maze
-    :return: True if the symbol is valid else False
-    """
-    if symbol == ".":
-        return False
-    if current_idx == "S":
-        if direction == "bottom" and symbol in ["|", "L", "J"]:
-            return True
-        if direction == "top" and symbol in ["|", "F", "Z"]:
-            return True
-        if direction == "left" and symbol in ["-", "L", "F"]:
-            return True
-        if direction == "right" and symbol in ["-", "J", "Z"]:
-            return True
-        return False
-
-    if current_idx in ["|"]:
-        if direction == "bottom" and symbol in ["|", "L", "J"]:
-            return True
-        if direction == "top" and symbol in ["|", "F", "Z"]:
-            return True
-        return False
-    if current_idx in ["-"]:
-        if direction == "left" and symbol in ["-", "L", "F"]:
-            return True
-        if direction == "right" and symbol in ["-", "J", "Z"]:
-            return True
-        return False
-    if current_idx in ["L"]:
-        if direction == "right" and symbol in ["-", "J", "Z"]:
-            return True
-        if direction == "top" and symbol in ["|", "F", "Z"]:
-            return True
-        return False
-    if current_idx in ["F"]:
-        if direction == "right" and symbol in ["-", "J", "Z"]:
-            return True
-        if direction == "bottom" and symbol in ["|", "L", "J"]:
-            return True
-        return False
-    if current_idx in ["Z"]:
-        if direction == "left" and symbol in ["-", "L", "F"]:
-            return True
-        if direction == "bottom" and symbol in ["|", "L", "J"]:
-            return True
-    if current_idx in ["J"]:
-        if direction == "left" and symbol in ["-", "L", "F"]:
-            return True
-        if direction == "top" and symbol in ["|", "F", "Z"]:
-            return True
-        return False
-    return False
-
-
-def get_next_steps(
-    arr: np.ndarray, i: str, original_arr: np.ndarray, current_positions: Optional[List[Tuple[int, int]]] = None
-) -> List[Tuple[int, int]]:
-    """
-    Given the current map and current position(s) - find the next possible moves
+    Encode the map as a grid of 4 bit connectivity masks, one bit per direction a pipe connects to
 
-    If no current _positions are provided - then find the current position using i which is a symbol to search for
-    :param arr: the map
-    :param i: symbol to search for
-    :param original_arr: untouched original array with symbols - used for extracting previous positions
-    :param current_positions: list of tuples indicating current positions along one side of the loop
-    :return: List of possible next steps
-    """
-    current_positions = np.argwhere(arr == i).tolist() if current_positions is None else current_positions
-    next_steps = []
-    for idx in current_positions:
-        mapping = {
-            "left": (idx[0], idx[1] - 1) if idx[1] > 0 else None,
-            "top": (idx[0] - 1, idx[1]) if idx[0] > 0 else None,
-            "right": (idx[0], idx[1] + 1) if idx[1] + 1 < arr.shape[1] else None,
-            "bottom": (idx[0] + 1, idx[1]) if idx[0] + 1 < arr.shape[0] else None,
-        }
-        direction: str
-        c: Optional[Tuple[int, int]]
-        for direction, c in mapping.items():
-            if c is not None:
-                if check_symbol(arr[c], direction, original_arr[idx[0], idx[1]]):
-                    next_steps.append(c)
-    return next_steps
-
-
-def is_numeric(value: str) -> bool:
-    """
-    Test if a string is a number e.g. "5" by trying to force to an integer
-    :param value: input string
-    :return: True if ValueError is not raised
-    """
-    try:
-        int(value)
-    except ValueError:
-        return False
-    else:
-        return True
-
-
-def take_steps(
-    arr: np.ndarray, steps: Dict[int, List[Tuple[int, int]]], i: int, step_history: Dict[int, List[Tuple[int, int]]]
-) -> Tuple[np.ndarray, Dict[int, List[Tuple[int, int]]]]:
-    """
-    Given a dictionary of steps along each side of the loop - take the next possible steps
-
-    This means replacing the next positions in the map with i which is np.max(arr) + 1
-    :param arr: current map
-    :param steps: a dict of next steps
-    :param i: step number
-    :param step_history: a dictionary mapping all previous steps along each side of the loop. Each step is a tuple.
-    :return: updated map, step_history
-    """
-    for loop, s in steps.items():
-        step_history[loop].extend(s)
-    for step in list(chain(*list(steps.values()))):
-        arr[step] = i
-    return arr, step_history
-
-
-def check_steps_for_end(arr: np.ndarray, steps: Dict[int, List[Tuple[int, int]]]) -> bool:
-    """
-    Check to see if you have reached the point where the two sides of the loop meet
+    Example:
+    "F" connects south and east -> SOUTH | EAST = 0b0110, "." connects nowhere -> 0
 
-    This will be the point where there is a co-ordinate in both sides of the loop and that co-ordinate maps to a symbol
-    which is not already numeric
-    :param arr: input map
-    :param steps: next possible positions
-    :return: True if the end point has been reached
-    """
-    duplicates = set.intersection(*[set(v) for v in steps.values()])
-    if len(duplicates) > 0:
-        if not any([is_numeric(arr[j]) for j in duplicates]):
-            return True
-    return False
-
-
-def find_path(arr: np.ndarray) -> Tuple[np.ndarray, int, Dict[int, List[Tuple[int, int]]]]:
-    """
-    Find the looping path through the array and stop at the point where the two sides of the loop meet
-    :param arr: input map
-    :return: mapped array, number of steps to meeting point, step_history
-    """
-    i = 0  # step counter
-    start = np.where(arr == "S")
-    original_arr = arr.copy()
-    arr[start] = 0
-    steps = get_next_steps(arr, str(i), original_arr)
-    steps_dict = {0: [steps[0]], 1: [steps[1]]}
-    step_history: Dict[int, List[Tuple[int, int]]] = {0: [], 1: []}
-    while not check_steps_for_end(arr, steps_dict):
-        i += 1
-        arr, step_history = take_steps(arr, steps_dict, i, step_history)
-        for key, pos in steps_dict.items():
-            steps_dict[key] = get_next_steps(arr, str(i), original_arr, pos)
-        if any([v == [] for v in steps_dict.values()]):
-            raise ValueError()
-    arr, step_history = take_steps(arr, steps_dict, i + 1, step_history)
-    return arr, i + 1, step_history
-
-
-def find_steps(data: List[str]) -> Tuple[int, np.ndarray, Dict[int, List[Tuple[int, int]]]]:
-    """
-    Find the number of steps taken to reach the middle of the loop
+    The start tile S is given the mask of the neighbouring pipes which connect back to it
     :param data: input data
-    :return: num of steps, mapped array with path and mapping of steps
+    :return: grid of masks, start position
+    """
+    lookup = np.zeros(256, dtype=np.uint8)
+    for symbol, mask in PIPES.items():
+        lookup[ord(symbol)] = mask
+    chars = np.frombuffer("".join(data).encode(), dtype=np.uint8).reshape(len(data), -1)
+    masks = lookup[chars]
+    start_row, start_col = (int(i) for i in np.argwhere(chars == ord("S"))[0])
+    start_mask = 0
+    for direction, (dr, dc) in MOVES.items():
+        r, c = start_row + dr, start_col + dc
+        if 0 <= r < masks.shape[0] and 0 <= c < masks.shape[1] and masks[r, c] & OPPOSITE[direction]:
+            start_mask |= direction
+    masks[start_row, start_col] = start_mask
+    return masks, (start_row, start_col)
+
+
+def follow_pipes(
+    grid: List[List[int]], start: Tuple[int, int], direction: int
+) -> Optional[Tuple[List[int], List[int]]]:
+    """
+    Follow the pipes from the start position, leaving in the given direction, until arriving back at the start
+
+    At each pipe the way out is the pipe's mask without the direction just arrived from, so every step is a couple of
+    integer operations. The grid should have a border of 0s so that leaving the map shows up as a broken pipe.
+    :param grid: padded grid of masks as nested lists
+    :param start: start position in the padded grid
+    :param direction: direction to leave the start position in
+    :return: rows and cols of the loop, or None if the pipes do not lead back to the start
+    """
+    moves = [MOVES.get(d, (0, 0)) for d in range(WEST + 1)]
+    came_from = [OPPOSITE.get(d, 0) for d in range(WEST + 1)]
+    r, c = start
+    rows, cols = [r], [c]
+    while True:
+        dr, dc = moves[direction]
+        r += dr
+        c += dc
+        mask = grid[r][c]
+        if not mask & came_from[direction]:
+            return None
+        if (r, c) == start:
+            return rows, cols
+        direction = mask & ~came_from[direction]
+        rows.append(r)
+        cols.append(c)
+
+
+def trace_loop(masks: np.ndarray, start: Tuple[int, int]) -> np.ndarray:
+    """
+    Follow the loop from the start position along one arm until it returns to the start
+
+    The grid is converted to nested lists first as indexing those is much faster than indexing a NumPy array one
+    element at a time. If more than two neighbours connect to the start then each way out is tried until one of them
+    leads back to the start.
+    :param masks: grid of masks from encode_map()
+    :param start: start position
+    :return: the ordered coordinates of the loop, starting at the start position
+    """
+    grid = np.pad(masks, 1).tolist()
+    for direction in MOVES:
+        if masks[start] & direction:
+            loop = follow_pipes(grid, (start[0] + 1, start[1] + 1), direction)
+            if loop is not None:
+                return np.array(loop, dtype=np.int32).T - 1
+    raise ValueError("There is no loop through the start position!")
+
+
+def gen_fig(masks: np.ndarray, loop: np.ndarray) -> None:
+    """
+    Generate an image to show the loop through the map
+    :param masks: grid of masks from encode_map()
+    :param loop: loop coordinates from trace_loop()
+    :return: void
     """
-    arr = np.array([list(l.replace("7", "Z")) for l in data])
-    arr = arr.astype("<U5")  # allows strings upto 5 digits long in the array
-    mapped_arr, i, step_history = find_path(arr)
-    return i, mapped_arr, step_history
+    arr = np.zeros(masks.shape, dtype=np.uint8)
+    arr[loop[:, 0], loop[:, 1]] = 1
+    plt.imshow(arr)
 
 
 def find_n_steps(data: List[str]) -> int:
@@ -217,130 +114,53 @@ def find_n_steps(data: List[str]) -> int:
     :param data: input data
     :return: number of steps required
     """
-    n, _, _ = find_steps(data)
-    return n
+    return len(trace_loop(*encode_map(data))) // 2
 
 
-def remove_connected_to_edge(binary_image: np.ndarray) -> np.ndarray:
+def get_loop_mask(masks: np.ndarray, loop: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
     """
-    Remove connected components which touch the edge of the array
-    :param binary_image: input binary image of 0s and 1s
-    :return: image without any components which touch the edge
+    Mark the tiles on the loop and give the start tile the mask of the two loop tiles it actually connects to
+    :param masks: grid of masks from encode_map()
+    :param loop: loop coordinates from trace_loop()
+    :return: boolean grid which is True on the loop, grid of masks with the start tile resolved
     """
-    # Label connected components
-    labeled_image, num_labels = ndimage.label(binary_image, structure=[[1, 1, 1], [1, 1, 1], [1, 1, 1]])
-
-    # Find pixels connected to the edge
-    edge_labels = np.unique(
-        np.concatenate(
-            (
-                labeled_image[0, :],
-                labeled_image[-1, :],
-                labeled_image[:, 0],
-                labeled_image[:, -1],
-            )
-        )
-    )
-
-    # Remove pixels connected to the edge
-    binary_image[np.isin(labeled_image, edge_labels)] = 0
+    on_loop = np.zeros(masks.shape, dtype=bool)
+    on_loop[loop[:, 0], loop[:, 1]] = True
+    masks = masks.copy()
+    start_mask = 0
+    for neighbour in (loop[1], loop[-1]):
+        step = tuple((neighbour - loop[0]).tolist())
+        start_mask |= next(d for d, move in MOVES.items() if move == step)
+    masks[loop[0, 0], loop[0, 1]] = start_mask
+    return on_loop, masks
 
-    return binary_image
 
-
-def make_maze_quick(arr: np.ndarray, step_history: Dict[int, List[Tuple[int, int]]]) -> np.ndarray:
+def count_row_interior(on_loop: np.ndarray, masks: np.ndarray) -> int:
     """
-    Convert the path from input arr to a 3x bigger array
+    Count the tiles in one row which are enclosed by the loop using the crossing parity rule
 
-    In the original array, one entry represents the path and the walls.
-    In the 3x array, the walls and the path and represented by separate entries
-    :param arr: input array
-    :param step_history: history of steps taken to solve the maze
-    :return: 3x array
+    Scanning along the row, a tile is inside the loop if the loop has been crossed an odd number of times to its left.
+    Only loop tiles which connect north count as crossings - a "|" crosses the row, and of the corners along a
+    horizontal run "L...7" crosses once while "L...J" turns back and crosses twice, so counting north connections
+    gets both right. The parity is a cumulative XOR of the crossings.
+    :param on_loop: boolean row which is True on the loop
+    :param masks: row of masks, with the start tile resolved
+    :return: number of enclosed tiles in the row
     """
-    big_arr = np.zeros([arr.shape[0] * 3, arr.shape[1] * 3])
-    coords = [*step_history[0], *list(reversed(step_history[1]))]
-    if not len(arr.shape) == 2:
-        raise ValueError("Numpy array should be 2-dimensional!")
-    # we have checked above to make sure the np.argwhere() results will be tuples of len 2
-    start: Tuple[int, int] = tuple(int(i) for i in np.argwhere(arr == "0").squeeze().tolist())  # type: ignore
-    coords.insert(0, start)
-    coords.append(start)
-    for i, c in enumerate(coords):
-        try:
-            cn = coords[i + 1]
-        except IndexError:
-            break
-        else:
-            min_y = min(c[0] * 3, cn[0] * 3)
-            max_y = max(c[0] * 3, cn[0] * 3)
-            max_y = max_y + 1 if max_y == min_y else max_y
-            min_x = min(c[1] * 3, cn[1] * 3)
-            max_x = max(c[1] * 3, cn[1] * 3)
-            max_x = max_x + 1 if max_x == max_x else max_x
-            big_arr[min_y:max_y, min_x:max_x] = 1
-    return big_arr
-
-
-def count_interior(arr: np.ndarray) -> np.ndarray:
-    """
-    Isolate the array entries (pixels) which are enclosed within the maze but are not part of the path
-    :param arr: 3x size maze - output of make_maze_quick()
-    :return: array of enclosed pixels
-    """
-    structure_element = np.array([[1, 1, 1], [1, 1, 1], [1, 1, 1]])
-    dilated_maze = binary_dilation(arr, structure=structure_element)
-    outside_mask = np.logical_not(ndimage.binary_fill_holes(arr).astype(int))
-    inverted_array = np.logical_not(dilated_maze)
-    inverted_array[outside_mask == 1] = 0
-    cleaned_array = remove_connected_to_edge(inverted_array)
-    return cleaned_array
-
-
-def shoelace_theorem(vertices: List[Tuple[int, int]]) -> float:
-    """
-    Use the Shoelace Theorem to calculate the area of a polygon using its vertices.
-
-    The area (A) of a polygon with vertices (x1, y1), (x2, y2), ..., (xn, yn) is given by:
-
-    A = 0.5 * |x1y2 + x2y3 + ... + xn*y1 - x2y1 - x3y2 - ... - x1yn|
-
-    This formula pairs consecutive vertices and sums the products of their coordinates,
-    then calculates the absolute difference between the two accumulated sums and divides
-    by 2 to obtain the area of the polygon.
-    :param vertices: the known vertices of the polygon
-    :return: the area of the polygon
-    """
-    n = len(vertices)
-    area = 0.0
-
-    for i in range(n - 1):
-        area += vertices[i][0] * vertices[i + 1][1]
-        area -= vertices[i + 1][0] * vertices[i][1]
-
-    # Add the contribution of the last edge
-    area += vertices[n - 1][0] * vertices[0][1]
-    area -= vertices[0][0] * vertices[n - 1][1]
-
-    # Take the absolute value and divide by 2
-    area = abs(area) / 2.0
-
-    return area
+    crossings = on_loop & ((masks & NORTH) != 0)
+    inside = np.logical_xor.accumulate(crossings)
+    return int(np.count_nonzero(inside & ~on_loop))
 
 
-def picks_theorem(b: int, area: Union[float, int]) -> int:
+def count_interior(rows: Iterable[Tuple[np.ndarray, np.ndarray]]) -> int:
     """
-    This function determines the number of interior lattice points from the number of boundary points
-    and the area of the polygon.
+    Count the tiles enclosed by the loop, one row at a time
 
-    A = I + B/2 - 1
-    where A is the area of the polygon, B is the number of boundary points and I is the number of interior lattice
-    points
-    :param b: number of boundary points
-    :param area: area of the polygon
-    :return: number of interior lattice points
+    Each row is independent so the rows can come from a stream and only one row needs to be held at a time
+    :param rows: (loop row, masks row) for each row of the map
+    :return: number of enclosed tiles
     """
-    return int(area + 1 - (b / 2))
+    return sum(count_row_interior(on_loop, masks) for on_loop, masks in rows)
 
 
 def solve(data: List[str], part: str = "a") -> int:
@@ -353,6 +173,6 @@ def solve(data: List[str], part: str = "a") -> int:
     if part == "a":
         return find_n_steps(data)
     else:
-        _, map_arr, step_history = find_steps(data)
-        coords = [*step_history[0], *list(reversed(step_history[1]))]
-        return picks_theorem(len(set(coords)), shoelace_theorem(coords))
+        masks, start = encode_map(data)
+        on_loop, masks = get_loop_mask(masks, trace_loop(masks, start))
+        return count_interior(zip(on_loop, masks))
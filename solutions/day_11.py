@@ -1,136 +1,183 @@
-from itertools import combinations
 from typing import List
+from typing import Optional
+from typing import Sequence
 from typing import Tuple
 
 import numpy as np
+from scipy.spatial import KDTree
 
 
 def format_input(data: List[str]) -> np.ndarray:
     """
     convert . to 0 and # to 1
-
-    set to uint16 to handle galaxy numbers > 255
     :param data: input data
     :return: formatted array
     """
-    arr = np.array([list(l) for l in data])
-    mask = np.isin(arr, ["."])
-    arr = np.where(mask, "0", arr)
-    mask = np.isin(arr, ["#"])
-    arr = np.where(mask, "1", arr)
-    arr = arr.astype("uint16")
-    return arr
+    chars = np.frombuffer("".join(data).encode(), dtype=np.uint8).reshape(len(data), -1)
+    return (chars == ord("#")).astype("uint16")
 
 
-def handle_expansion(arr: np.ndarray, expansion_rate: int = 1) -> Tuple[np.ndarray, List[int], List[int]]:
+def locate_galaxies(arr: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
     """
-    Empty columns and rows should be duplicated
+    Find the coordinates of each galaxy and the number of empty rows and cols before it
 
-    np.sum() used across columns and rows and indices extracted for sum==0. Then insert empty col/row
-    after each of these indices
-    :param arr: input array
-    :param expansion_rate: the number of empty rows/cols to replace each empty row/col with
-    :return: expanded array
-    """
-    empty_cols = [i for i, x in enumerate(np.sum(arr, axis=0)) if x == 0]
-    empty_rows = [i for i, x in enumerate(np.sum(arr, axis=1)) if x == 0]
-
-    if expansion_rate == 1:
-        for i, idx in enumerate(empty_cols):
-            arr = np.insert(
-                arr,
-                idx + 1 + i * (expansion_rate - 1),
-                np.zeros(
-                    (
-                        expansion_rate - 1,
-                        arr.shape[0],
-                    )
-                ),
-                axis=1,
-            )
-        for i, idx in enumerate(empty_rows):
-            arr = np.insert(
-                arr, idx + 1 + i * (expansion_rate - 1), np.zeros((expansion_rate - 1, arr.shape[1])), axis=0
-            )
-    return arr, empty_rows, empty_cols
-
-
-def label_galaxies(arr: np.ndarray) -> np.ndarray:
+    The empty rows/cols before each row/col are a prefix sum over the empty rows/cols of the image, so a galaxy's
+    expanded coordinate is its coordinate plus (expansion_rate - 1) times the number of empty rows/cols before it.
+    :param arr: formatted image array
+    :return: galaxy rows, galaxy cols, empty rows before each galaxy, empty cols before each galaxy
     """
-    Assign each galaxy a unique identifier
+    empty_rows = ~arr.any(axis=1)
+    empty_cols = ~arr.any(axis=0)
+    empty_rows_before = np.cumsum(empty_rows) - empty_rows
+    empty_cols_before = np.cumsum(empty_cols) - empty_cols
+    rows, cols = np.nonzero(arr)
+    return rows, cols, empty_rows_before[rows], empty_cols_before[cols]
 
-    :param arr: input array
-    :return: labeled array
+
+def sum_pairwise_distances(values: np.ndarray) -> int:
     """
-    galaxies = np.argwhere(arr == 1).tolist()
-    for i, c in enumerate(galaxies):
-        arr[*c] = i + 1
-    return arr
+    Sum |a - b| over every pair of values without forming the pairs
 
+    Once sorted, the value at position k is larger than the k values before it and smaller than the n - 1 - k values
+    after it, so it contributes to the sum with weight k - (n - 1 - k).
 
-def shortest_path_between_ones(
-    start: List[int], end: List[int], empty_rows: List[int], empty_cols: List[int], expansion_rate: int
-) -> int:
-    """
-    Calculate Euclidean distance between two 2D coordinates
-    :param start: first coordinate
-    :param end: second coordinate
-    :param empty_rows: indices of empty rows in the original array
-    :param empty_cols: indices of empty cols in the original array
-    :param expansion_rate: the number of empty rows/cols to replace each empty row/col with
-    :return: Euclidean distance
+    Example:
+    [1, 4, 6] -> 1 * -2 + 4 * 0 + 6 * 2 = 10 = (4 - 1) + (6 - 1) + (6 - 4)
+    :param values: input values
+    :return: sum of absolute differences over all pairs
     """
-    if expansion_rate == 1:
-        return abs(start[0] - end[0]) + abs(start[1] - end[1])
-    else:
-        empty_cols_before_start = [x for x in empty_cols if x < start[1]]
-        empty_rows_before_start = [x for x in empty_rows if x < start[0]]
-        start = [
-            start[0] + len(empty_rows_before_start) * (expansion_rate - 1),
-            start[1] + len(empty_cols_before_start) * (expansion_rate - 1),
-        ]
+    n = len(values)
+    weights = 2 * np.arange(n, dtype=np.int64) - (n - 1)
+    return int(np.sort(values).astype(np.int64) @ weights)
 
-        empty_cols_before_end = [x for x in empty_cols if x < end[1]]
-        empty_rows_before_end = [x for x in empty_rows if x < end[0]]
-        end = [
-            end[0] + len(empty_rows_before_end) * (expansion_rate - 1),
-            end[1] + len(empty_cols_before_end) * (expansion_rate - 1),
-        ]
 
-        raw_dist = abs(start[0] - end[0]) + abs(start[1] - end[1])
-        return raw_dist
+class GalaxyField:
+    """
+    A class to answer distance queries between the galaxies of an image for any expansion rate
 
+    The image is scanned once on creation. Every expanded coordinate is linear in the expansion rate, so the totals
+    over all galaxies are cached as base + (expansion_rate - 1) * expanded and any expansion rate costs O(1).
+    """
 
-def get_distances(arr: np.ndarray, empty_rows: List[int], empty_cols: List[int], expansion_rate: int) -> List[int]:
+    def __init__(self, data: List[str]) -> None:
+        rows, cols, empty_rows_before, empty_cols_before = locate_galaxies(format_input(data))
+        self.coords: np.ndarray = np.stack([rows, cols], axis=1).astype(np.int64)
+        self.empty_before: np.ndarray = np.stack([empty_rows_before, empty_cols_before], axis=1).astype(np.int64)
+        self._base: int = self._sum_distances(self.coords)
+        self._expanded: int = self._sum_distances(self.empty_before)
+
+    def __len__(self) -> int:
+        return len(self.coords)
+
+    @staticmethod
+    def _sum_distances(coords: np.ndarray) -> int:
+        """
+        Sum the Manhattan distances between every pair of coordinates
+        :param coords: coordinates, one row per galaxy
+        :return: sum of distances
+        """
+        return sum(sum_pairwise_distances(coords[:, axis]) for axis in range(coords.shape[1]))
+
+    def positions(self, expansion_rate: int = 2, galaxies: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Get the coordinates of galaxies in the expanded image
+
+        If the coordinates (or the sum of differences of two of them) could overflow int64 they are worked out on
+        object arrays of Python ints instead.
+        :param expansion_rate: the number of empty rows/cols to replace each empty row/col with
+        :param galaxies: indices of the galaxies to get, defaults to all galaxies
+        :return: expanded coordinates, one row per galaxy
+        """
+        coords, empty_before = self.coords, self.empty_before
+        if galaxies is not None:
+            coords, empty_before = coords[galaxies], empty_before[galaxies]
+        bound = int(self.coords.max(initial=0)) + abs(expansion_rate - 1) * int(self.empty_before.max(initial=0))
+        if bound < 2**61:
+            return coords + (expansion_rate - 1) * empty_before
+        return coords.astype(object) + (expansion_rate - 1) * empty_before.astype(object)
+
+    def total_distances(self, expansion_rates: Sequence[int], galaxies: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Find total distance between every pair of galaxies for several expansion rates at once
+
+        The distance between two galaxies is the Manhattan distance, which splits into a sum over rows and a sum over
+        cols. The expansion adds (expansion_rate - 1) times the number of empty rows/cols between the galaxies, so
+        the total is base + (expansion_rate - 1) * expanded where base is the total over the raw coordinates and
+        expanded the total over the empty rows/cols before each galaxy. For a subset of galaxies both totals are
+        found in O(k log k) with sum_pairwise_distances(), otherwise the cached totals are used. The totals are Python
+        ints so are exact for any expansion rate.
+        :param expansion_rates: the number of empty rows/cols to replace each empty row/col with
+        :param galaxies: indices of the galaxies to include, defaults to all galaxies
+        :return: sum of distances for each expansion rate, as an object array of Python ints
+        """
+        if galaxies is None:
+            base, expanded = self._base, self._expanded
+        else:
+            galaxies = np.asarray(galaxies)
+            base = self._sum_distances(self.coords[galaxies])
+            expanded = self._sum_distances(self.empty_before[galaxies])
+        return np.array([base + (int(r) - 1) * expanded for r in expansion_rates], dtype=object)
+
+    def total_distance(self, expansion_rate: int = 2, galaxies: Optional[np.ndarray] = None) -> int:
+        """
+        Find total distance between every pair of galaxies
+        :param expansion_rate: the number of empty rows/cols to replace each empty row/col with
+        :param galaxies: indices of the galaxies to include, defaults to all galaxies
+        :return: sum of distances
+        """
+        return int(self.total_distances([expansion_rate], galaxies)[0])
+
+    def pair_distances(self, first: np.ndarray, second: np.ndarray, expansion_rate: int = 2) -> np.ndarray:
+        """
+        Find the distance between each pair of galaxies first[i] and second[i]
+        :param first: indices of the first galaxy of each pair
+        :param second: indices of the second galaxy of each pair
+        :param expansion_rate: the number of empty rows/cols to replace each empty row/col with
+        :return: distance of each pair
+        """
+        return np.abs(self.positions(expansion_rate, first) - self.positions(expansion_rate, second)).sum(axis=1)
+
+    def nearest_neighbours(
+        self, expansion_rate: int = 2, galaxies: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the nearest other galaxy to each galaxy
+
+        The expanded positions are put in a KD tree queried with the Manhattan metric, asking for the two closest
+        galaxies since the closest is always the galaxy itself. The tree works in floats, so for positions beyond 2^53
+        ties may be broken arbitrarily, but the distances returned are always exact.
+        :param expansion_rate: the number of empty rows/cols to replace each empty row/col with
+        :param galaxies: indices of the galaxies to search amongst, defaults to all galaxies
+        :return: index of the nearest galaxy and the distance to it, for each galaxy searched
+        """
+        galaxies = np.arange(len(self)) if galaxies is None else np.asarray(galaxies)
+        if len(galaxies) < 2:
+            raise ValueError("Need at least two galaxies to find nearest neighbours!")
+        positions = self.positions(expansion_rate, galaxies)
+        points = positions.astype(np.float64)
+        _, nearest = KDTree(points).query(points, k=2, p=1)
+        neighbours = np.where(nearest[:, 0] == np.arange(len(galaxies)), nearest[:, 1], nearest[:, 0])
+        return galaxies[neighbours], np.abs(positions - positions[neighbours]).sum(axis=1)
+
+
+def find_total_distances(data: List[str], expansion_rates: Sequence[int]) -> np.ndarray:
     """
-    Calculate distance between every pair of galaxies
-    :param arr: input map of galaxies
-    :param empty_rows: indices of empty rows in the original array
-    :param empty_cols: indices of empty cols in the original array
-    :param expansion_rate: the number of empty rows/cols to replace each empty row/col with
-    :return: list of distances
+    Find total distance between galaxies for several expansion rates at once
+    :param data: input data
+    :param expansion_rates: the number of empty rows/cols to replace each empty row/col with
+    :return: sum of distances for each expansion rate, as an object array of Python ints
     """
-    galaxies = [i for i in np.unique(arr) if i > 0]
-    locations = {i: np.argwhere(arr == i).tolist()[0] for i in galaxies}
-    pairs = list(combinations(galaxies, r=2))
-    distances = [
-        shortest_path_between_ones(locations[g1], locations[g2], empty_rows, empty_cols, expansion_rate)
-        for g1, g2 in pairs
-    ]
-    return distances
+    return GalaxyField(data).total_distances(expansion_rates)
 
 
-def find_total_distance(data: List[str], expansion_rate: int = 1) -> int:
+def find_total_distance(data: List[str], expansion_rate: int = 2) -> int:
     """
     Find total distance between galaxies
     :param data: input data
     :param expansion_rate: the number of empty rows/cols to replace each empty row/col with
     :return: sum of distances
     """
-    arr, empty_rows, empty_cols = handle_expansion(format_input(data), expansion_rate)
-    arr = label_galaxies(arr)
-    dists = get_distances(arr, empty_rows, empty_cols, expansion_rate)
-    return sum(dists)
+    return GalaxyField(data).total_distance(expansion_rate)
 
 
 def solve(data: List[str], part: str = "a") -> int:
@@ -140,7 +187,8 @@ def solve(data: List[str], part: str = "a") -> int:
     :param part: which part of the problem to solve - 'a' or 'b'
     :return: solution
     """
+    field = GalaxyField(data)
     if part == "a":
-        return find_total_distance(data)
+        return field.total_distance()
     else:
-        return find_total_distance(data, expansion_rate=1000000)
+        return field.total_distance(expansion_rate=1000000)
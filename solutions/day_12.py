@@ -1,35 +1,54 @@
-from functools import cache
-from itertools import chain
+import logging
+import os
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from itertools import accumulate
 from itertools import groupby
 from itertools import product
-from typing import Generator
-from typing import Iterable
+from typing import Callable
+from typing import Dict
 from typing import List
+from typing import Optional
+from typing import Sequence
 from typing import Tuple
-from typing import Union
 
+import numpy as np
 import tqdm
 
+UNFOLD_FACTOR = 5
 
-def format_input(data: List[str], part: str = "a") -> List[Union[Tuple[str, List[int]], Tuple[str, Tuple[int, ...]]]]:
+
+def format_input(data: List[str], part: str = "a", unfold: int = UNFOLD_FACTOR) -> List[Tuple[str, Tuple[int, ...]]]:
     """
     Format the input data for analysis
 
-    If part == "b" then need to account for real input being 5x the given input.
-    If part == "b" then the counts list is converted to tuple for caching
+    If part == "b" then need to account for real input being unfold times the given input.
     :param data: input data
     :param part: the part of the AOC problem to solve
+    :param unfold: the number of copies of each row to join for part b
     :return: formatted data - input split into the string input and counts
     """
     split_data = [d.split(" ") for d in data]
-    formatted_data: List[Union[Tuple[str, List[int]], Tuple[str, Tuple[int, ...]]]] = [
-        (row, list(map(int, counts.split(",")))) for row, counts in split_data
-    ]
+    formatted_data = [(row, tuple(int(c) for c in counts.split(","))) for row, counts in split_data]
     if part == "b":
-        return [(((row + "?") * 5)[:-1], tuple(counts * 5)) for row, counts in formatted_data]
+        return [unfold_row(row, counts, unfold) for row, counts in formatted_data]
     return formatted_data
 
 
+def unfold_row(row: str, springs: Sequence[int], unfold: int) -> Tuple[str, Tuple[int, ...]]:
+    """
+    Unfold a row by joining unfold copies of it with "?" and repeating the counts unfold times
+    :param row: input row
+    :param springs: counts
+    :param unfold: number of copies
+    :return: unfolded row and counts
+    """
+    return "?".join([row] * unfold), tuple(springs) * unfold
+
+
 def generate_possibilities(row: str) -> product:
     """
     Create a generator of the possible combinations for unknown springs
@@ -51,90 +70,264 @@ def get_contigous_ones(row: str) -> List[int]:
     return [sum(1 for _ in group) for key, group in groupby(list(row)) if key == "#"]
 
 
-@cache
-def analyse_segment(seg: str) -> List[List[int]]:
+def replace_unknowns(row: str, values: Sequence[str]) -> str:
     """
-    Analyse a segment of springs by brute force
-    :param seg: imput string
-    :return: list contigous #s for each possibility
+    Replace unknowns "?" with "." or "#" to generate possible string
+    :param row: input string with unknowns
+    :param values: replacements for the unknowns - sequence with length equal to number of unknowns
+    :return: string without unknowns
     """
-    return [get_contigous_ones(replace_unknowns(seg, list(s))) for s in generate_possibilities(seg)]
+    replacements = iter(values)
+    return "".join(next(replacements) if char == "?" else char for char in row)
 
 
-@cache
-def analyse_row(row: str, springs: Tuple[int, ...], counter: int = 0) -> int:
+def count_arrangements_brute_force(row: str, springs: Sequence[int]) -> int:
     """
-    Solve the problem using recursion and caching
+    Count the arrangements of the unknown springs in the row which match the counts by trying every possibility
 
-    Iterate over the input row until ? is reached which is not followed by #. These are branch points so we split and
-    repeat recursively along each possibility and keep a track of how many possibilities we have come across (result)
+    Takes 2^n time for n unknowns so is only used to check count_arrangements() on small rows
     :param row: input data row
     :param springs: counts
-    :param counter: counter for number of possibilities
     :return: number of possibilities
     """
-    if not springs:
-        return "#" not in row
-    current, springs = springs[0], springs[1:]
-    for i in range(len(row) - sum(springs) - len(springs) - current + 1):
-        if "#" in row[:i]:
-            break
-        if (nxt := i + current) <= len(row) and "." not in row[i:nxt] and row[nxt : nxt + 1] != "#":
-            # if this is true it means we have reached a new branch point - there could be a 1 or 0 at this position
-            # so need to keep iterating along both options
-            # but no need to check it if the next position is # as we know whether it will be a 1 or 0 based on the
-            # counts
-            counter += analyse_row(row[nxt + 1 :], springs)
-    return counter
+    return sum(get_contigous_ones(replace_unknowns(row, s)) == list(springs) for s in generate_possibilities(row))
 
 
-def get_n_possible_combinations(row: str, counts: List[int]) -> int:
+def get_prefix_counts(row: str, char: str) -> List[int]:
     """
-    Get the number of possible combinations of row which fit counts by brute force
+    Count the occurrences of char in each prefix of row, so the count in row[i:j] is counts[j] - counts[i]
     :param row: input row
-    :param counts: true counts
+    :param char: the character to count
+    :return: counts with counts[i] being the number of char in row[:i]
+    """
+    return [0, *accumulate(c == char for c in row)]
+
+
+def count_arrangements(row: str, springs: Sequence[int]) -> int:
+    """
+    Count the arrangements of the unknown springs in the row which match the counts using dynamic programming
+
+    ways[i] is the number of arrangements of the remaining groups in row[i:]. Working backwards through the groups,
+    each position is either a "." (skip to i + 1) or the start of the next group of length n, which is only possible
+    if row[i:i + n] holds no "." and row[i + n] is not "#" - both checked in O(1) with prefix counts. The row is
+    padded with a "." so the last group can always be followed by one. Only the table for the previous group is
+    kept, so the memory is O(len(row)) and released once the row is done, and counts are Python ints so are exact.
+
+    Example:
+    "???.###" with springs (1, 1, 3) -> 1 arrangement "#.#.###"
+    :param row: input data row
+    :param springs: counts
     :return: number of possibilities
     """
-    # get possible combinations for each group
-    res = [analyse_segment(s) for s in row.split(".") if s != ""]
-    # combine the cgroups and check against the true
-    options = [list(chain(*l)) for l in product(*res)]
-    return len([x for x in options if x == counts])
+    row = row + "."
+    length = len(row)
+    dots = get_prefix_counts(row, ".")
+    hashes = get_prefix_counts(row, "#")
+    # with no groups left, the rest of the row must not contain any damaged springs
+    ways = [int(hashes[length] == hashes[i]) for i in range(length + 1)]
+    for n in reversed(springs):
+        next_ways = [0] * (length + 1)
+        for i in range(length - n - 1, -1, -1):
+            count = next_ways[i + 1] if row[i] != "#" else 0
+            if dots[i + n] == dots[i] and row[i + n] != "#":
+                count += ways[i + n + 1]
+            next_ways[i] = count
+        ways = next_ways
+    return ways[0]
 
 
-def replace_unknowns(row: str, values: List[int]) -> str:
+def count_unfolded_arrangements(row: str, springs: Sequence[int], max_unfold: int) -> List[int]:
     """
-    Replace unknowns "?" with "." or "#" to generate possible string
-    :param row: input string with unknowns
-    :param values: replacements for the unknowns - list with length equal to number of unknowns
-    :return: string without unknowns
+    Count the arrangements of a row for every unfold factor from 1 to max_unfold in one pass
+
+    The unfolded rows are prefixes of each other - the row for k + 1 is the row for k followed by the "?" joiner and
+    another copy. So a forward version of the table in count_arrangements() is run once over max_unfold copies, with
+    ways[i][t] the number of ways to fill the first i springs with the first t groups and spring i - 1 not "#". Each
+    copy plus its joiner applies the same transfer to the table, and the answer for k is read off straight after
+    the k-th joiner, treating it as the "." that ends the row: ways[k * (len(row) + 1)][k * len(springs)].
+    Groups with the same length are advanced together as slices of the table.
+
+    Example:
+    "???.###" with springs (1, 1, 3) -> [1, 1, 1]
+    :param row: input data row
+    :param springs: counts
+    :param max_unfold: the largest unfold factor to count
+    :return: number of possibilities for each unfold factor from 1 to max_unfold
+    """
+    unfolded = (row + "?") * max_unfold
+    length = len(unfolded)
+    n_groups = len(springs) * max_unfold
+    dots = get_prefix_counts(unfolded, ".")
+    group_lengths = np.tile(springs, max_unfold)
+    groups = {n: np.flatnonzero(group_lengths == n) for n in set(springs)}
+    ways = np.zeros((length + 1, n_groups + 1), dtype=object)
+    ways[0, 0] = 1
+    for i, char in enumerate(unfolded):
+        if char != "#":
+            ways[i + 1] += ways[i]
+        for n, index in groups.items():
+            if i + n < length and dots[i + n] == dots[i] and unfolded[i + n] != "#":
+                ways[i + n + 1, index + 1] += ways[i, index]
+    return [ways[k * (len(row) + 1), k * len(springs)] for k in range(1, max_unfold + 1)]
+
+
+def get_unfolded_combinations(data: List[str], unfolds: Sequence[int]) -> Dict[int, int]:
+    """
+    Get the total possible combinations for several unfold factors, sharing one pass per row between them
+    :param data: input data
+    :param unfolds: the unfold factors
+    :return: mapping of each unfold factor to the number of combinations
     """
-    return "".join(str(values.pop(0)) if char == "?" else char for char in row)
+    max_unfold = max(unfolds)
+    totals = [0] * max_unfold
+    for row, springs in tqdm.tqdm(format_input(data)):
+        totals = [a + b for a, b in zip(totals, count_unfolded_arrangements(row, springs, max_unfold))]
+    return {k: totals[k - 1] for k in unfolds}
 
 
-def get_total_possible_combinations(data: List[str], part: str = "a") -> int:
+def verify_arrangement_counts(
+    n_rows: int = 1000, max_length: int = 12, max_unfold: int = 3, seed: Optional[int] = None
+) -> None:
+    """
+    Check the dynamic programming counts against brute force on small random rows
+
+    The unfolded sweep is also checked against count_arrangements() on the unfolded rows for every unfold factor up
+    to max_unfold, so the transfer over the "?" joiner is covered.
+    :param n_rows: number of random rows to check
+    :param max_length: maximum length of the random rows
+    :param max_unfold: largest unfold factor to check the sweep with
+    :param seed: seed for the random number generator
+    :return: void
+    """
+    rng = random.Random(seed)
+    for _ in range(n_rows):
+        row = "".join(rng.choices(".#?", weights=[1, 1, 2], k=rng.randint(1, max_length)))
+        springs = tuple(rng.randint(1, 4) for _ in range(rng.randint(1, 4)))
+        expected = count_arrangements_brute_force(row, springs)
+        counts = [count_arrangements(row, springs), count_unfolded_arrangements(row, springs, 1)[0]]
+        if any(c != expected for c in counts):
+            raise ValueError(f"Counts {counts} for {row} {springs} do not match brute force count {expected}!")
+        unfolded = [count_arrangements(*unfold_row(row, springs, k)) for k in range(1, max_unfold + 1)]
+        if count_unfolded_arrangements(row, springs, max_unfold) != unfolded:
+            raise ValueError(f"Unfolded counts for {row} {springs} do not match {unfolded}!")
+
+
+@dataclass
+class WorkerStats:
+    """
+    Cache and memory statistics of a worker process counting arrangements
+    """
+
+    pid: int
+    rows: int
+    hits: int
+    misses: int
+    peak_memory: int
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        Get the fraction of rows which were answered from the cache
+        :return: cache hit rate
+        """
+        return self.hits / max(self.hits + self.misses, 1)
+
+
+_worker_counter: Optional[Callable[[str, Tuple[int, ...]], int]] = None
+_worker_rows: int = 0
+
+
+def _init_worker(cache_size: int) -> None:
+    """
+    Give a worker process its own memo table of row counts, holding at most cache_size rows
+    :param cache_size: maximum number of rows to keep in the memo table
+    :return: void
+    """
+    global _worker_counter  # pylint: disable=global-statement
+    _worker_counter = lru_cache(maxsize=cache_size)(count_arrangements)
+
+
+def _count_chunk(rows: List[Tuple[str, Tuple[int, ...]]]) -> Tuple[int, WorkerStats]:
+    """
+    Count the arrangements of a chunk of rows in a worker process
+    :param rows: the rows and counts to count
+    :return: total number of arrangements, statistics of the worker so far
+    """
+    global _worker_rows  # pylint: disable=global-statement
+    if _worker_counter is None:
+        raise ValueError("Worker has not been initialised!")
+    total = sum(_worker_counter(*r) for r in rows)
+    _worker_rows += len(rows)
+    info = _worker_counter.cache_info()  # type: ignore[attr-defined]
+    # resource is only available on Unix so is only imported when the stats are needed
+    import resource  # pylint: disable=import-outside-toplevel
+
+    # ru_maxrss is in bytes on macOS but kilobytes elsewhere
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    return total, WorkerStats(os.getpid(), _worker_rows, info.hits, info.misses, peak)
+
+
+def count_combinations_parallel(
+    rows: List[Tuple[str, Tuple[int, ...]]],
+    n_workers: Optional[int] = None,
+    chunk_size: int = 256,
+    cache_size: int = 4096,
+) -> Tuple[int, List[WorkerStats]]:
+    """
+    Count the total arrangements of the rows by sending chunks of rows to worker processes
+
+    The rows are independent so each worker counts its chunks with its own memo table, which is an LRU cache bounded
+    to cache_size rows so memory stays flat on huge generated inputs with repeated rows.
+    :param rows: the rows and counts to count
+    :param n_workers: number of worker processes, defaults to the number of CPUs
+    :param chunk_size: number of rows to send to a worker at once
+    :param cache_size: maximum number of rows in each worker's memo table
+    :return: total number of arrangements, statistics of each worker
+    """
+    chunks = [rows[i : i + chunk_size] for i in range(0, len(rows), chunk_size)]
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker, initargs=(cache_size,)) as executor:
+        results = list(executor.map(_count_chunk, chunks))
+    # the statistics are cumulative so keep the latest from each worker
+    stats: Dict[int, WorkerStats] = {}
+    for _, s in results:
+        if s.pid not in stats or s.rows > stats[s.pid].rows:
+            stats[s.pid] = s
+    for s in stats.values():
+        logging.info(
+            "Worker %s counted %s rows with cache hit rate %.2f and peak memory %s bytes",
+            s.pid,
+            s.rows,
+            s.hit_rate,
+            s.peak_memory,
+        )
+    return sum(total for total, _ in results), list(stats.values())
+
+
+def get_total_possible_combinations(
+    data: List[str], part: str = "a", unfold: int = UNFOLD_FACTOR, n_workers: Optional[int] = None
+) -> int:
     """
     Get total possble combinations for parts A or B
     :param data: input data
     :param part: the part of the problem to solve
+    :param unfold: the number of copies of each row to join for part b
+    :param n_workers: if given, count the rows in parallel with this many worker processes
     :return: number of combinations
     """
-    f = format_input(data, part)
-    if part == "a":
-        ns = [get_n_possible_combinations(*d) for d in tqdm.tqdm(f)]
-    else:
-        ns = [analyse_row(*d) for d in tqdm.tqdm(f)]
-    return sum(ns)
+    if n_workers is not None:
+        return count_combinations_parallel(format_input(data, part, unfold), n_workers)[0]
+    return sum(count_arrangements(*d) for d in tqdm.tqdm(format_input(data, part, unfold)))
 
 
-def solve(data: List[str], part: str = "a") -> int:
+def solve(data: List[str], part: str = "a", unfold: int = UNFOLD_FACTOR) -> int:
     """
     Solve the problem for day 1
     :param data: input data
     :param part: which part of the problem to solve - 'a' or 'b'
+    :param unfold: the number of copies of each row to join for part b
     :return: solution
     """
     if part == "a":
         return get_total_possible_combinations(data, part="a")
     else:
-        return get_total_possible_combinations(data, part="b")
+        return get_total_possible_combinations(data, part="b", unfold=unfold)
@@ -1,6 +1,7 @@
 from itertools import groupby
 from typing import List
 from typing import Optional
+from typing import Tuple
 
 import matplotlib.pyplot as plt
 import numpy as np
@@ -38,164 +39,122 @@ def format_puzzle(puzzle_data: List[str]) -> np.ndarray:
     return np.array([list(l) for l in puzzle_data])
 
 
-def find_vertical_mirror(puzzle: np.ndarray, old_ans: Optional[int] = None) -> Optional[int]:
+def get_masks(puzzle: np.ndarray) -> List[int]:
     """
-    Find a vertical mirror in the puzzle input
+    Encode each row of the puzzle as an integer bitmask with a bit set for each "#"
 
-    Reflection must be True from the line all the way to the far left or far right.
+    The rows are packed 8 cells to a byte so puzzles of any width fit, and comparing two rows is then a single
+    integer comparison. Pass the transposed puzzle to get the column masks.
 
-    If no mirror line is found then return None
+    Example:
+    ["#.##", "..#."] -> [0b10110000, 0b00100000]
     :param puzzle: input puzzle
-    :param old_ans: a previous answer which the real answer cannot be equal to
-    :return: index of the column to the left of the line or None
-    """
-    mirror_line = None
-    for i in range(puzzle.shape[1] - 1):
-        c1 = puzzle[:, i]
-        c2 = puzzle[:, i + 1]
-        if check_equal(c1, c2):  # this means that cols i and i+1 are equal and are possible mirror line
-            d = 0
-            while check_equal(c1, c2):
-                d += 1
-                if i - d < 0:
-                    mirror_line = i
-                    break
-                try:
-                    c1 = puzzle[:, i - d]
-                    c2 = puzzle[:, i + 1 + d]
-                except IndexError:
-                    mirror_line = i
-                    break
-                else:
-                    pass
-            if mirror_line is None:
-                continue  # check for another possible mirror line
-            elif old_ans is not None and mirror_line == old_ans - 1:
-                mirror_line = None
-                continue
-            else:
-                break
-    return mirror_line
+    :return: bitmask of each row
+    """
+    return pack_rows(puzzle == "#")
 
 
-def check_equal(x: np.ndarray, y: np.ndarray) -> bool:
+def pack_rows(cells: np.ndarray) -> List[int]:
     """
-    Check if two arrays are equal
-    :param x: array 1
-    :param y: array 2
-    :return: True if equal else False
+    Encode each row of a boolean array as an integer bitmask, packing 8 cells to a byte
+    :param cells: boolean array
+    :return: bitmask of each row
     """
-    return bool(np.all(x == y))
+    return [int.from_bytes(row.tobytes(), "big") for row in np.packbits(cells, axis=1)]
+
 
+def get_all_masks(data: List[str]) -> List[Tuple[List[int], List[int]]]:
+    """
+    Encode every puzzle in the input as row and column bitmasks in one go
 
-def find_horizontal_mirror(puzzle: np.ndarray, old_ans: Optional[int] = None) -> Optional[int]:
+    The whole input is padded to the widest line and converted to a single boolean array, and the row masks of every
+    line are packed at once. Each puzzle is then a slice of the array, so only its columns need packing separately.
+    Padding the rows with "." adds the same zero bits to every row so comparisons are unaffected.
+    :param data: input data
+    :return: row masks and column masks of each puzzle
     """
-    Find a horizontal mirror in the puzzle input
+    width = max((len(line) for line in data), default=0)
+    chars = np.frombuffer("".join(line.ljust(width, ".") for line in data).encode(), dtype=np.uint8)
+    cells = (chars == ord("#")).reshape(len(data), width)
+    row_masks = pack_rows(cells)
+    masks = []
+    start = 0
+    for key, group in groupby(data, key=lambda x: x == ""):
+        n = len(list(group))
+        if not key:
+            puzzle_width = len(data[start])
+            masks.append((row_masks[start : start + n], pack_rows(cells[start : start + n, :puzzle_width].T)))
+        start += n
+    return masks
 
-    Reflection must be True from the line all the way to the top or bottom.
+
+def find_mirror(masks: List[int], smudges: int = 0) -> Optional[int]:
+    """
+    Find a mirror line between the rows (or columns) of a puzzle given as bitmasks
+
+    Reflection must be True from the line all the way to the nearest edge, so the rows before the line are compared
+    with the rows after it in reverse order, up to the nearest edge. The number of cells which differ between two rows
+    is the popcount of the XOR of their masks, and the mirror line is the one where exactly smudges cells differ in
+    total - 0 for a perfect mirror.
 
     If no mirror line is found then return None
-    :param puzzle: input puzzle
-    :param old_ans: a previous answer which the real answer cannot be equal to
-    :return: index of the row above the line or None
-    """
-    mirror_line = None
-    for i in range(puzzle.shape[0] - 1):
-        c1 = puzzle[i, :]
-        c2 = puzzle[i + 1, :]
-        if check_equal(c1, c2):  # this means that rows i and i+1 are equal and are possible mirror line
-            d = 0
-            while check_equal(c1, c2):
-                d += 1
-                if i - d < 0:
-                    mirror_line = i
-                    break
-                try:
-                    c1 = puzzle[i - d, :]
-                    c2 = puzzle[i + 1 + d, :]
-                except IndexError:
-                    mirror_line = i
-                    break
-                else:
-                    pass
-            if mirror_line is None:
-                continue
-            elif old_ans is not None and mirror_line == (old_ans / 100) - 1:
-                mirror_line = None
-                continue
-            else:
+    :param masks: bitmask of each row
+    :param smudges: number of smudged cells on the mirror
+    :return: number of rows before the line or None
+    """
+    n = len(masks)
+    for i in range(1, n):
+        k = min(i, n - i)
+        mismatches = 0
+        for before, after in zip(masks[i - k : i], masks[i + k - 1 : i - 1 : -1]):
+            mismatches += (before ^ after).bit_count()
+            if mismatches > smudges:
                 break
-    return mirror_line
+        if mismatches == smudges:
+            return i
+    return None
 
 
-def solve_puzzle(puzzle: np.ndarray, old_ans: Optional[int] = None) -> int:
+def solve_puzzle(puzzle: np.ndarray, smudges: int = 0) -> int:
     """
     Solve a given puzzle by finding either a vertical or horizontal mirror line
 
     The answer should be the number of cols to left or number of rows (*100) above the mirror line
     If no mirror line is found then should return 0
     :param puzzle: input puzzle
-    :param old_ans: a previous answer which the real answer cannot be equal to
+    :param smudges: number of smudged cells on the mirror
+    :return: answer for the puzzle
+    """
+    return score_mirror(get_masks(puzzle), get_masks(puzzle.T), smudges)
+
+
+def score_mirror(row_masks: List[int], col_masks: List[int], smudges: int = 0) -> int:
+    """
+    Find either a vertical or horizontal mirror line in a puzzle given as bitmasks and score it as solve_puzzle() does
+    :param row_masks: bitmask of each row
+    :param col_masks: bitmask of each column
+    :param smudges: number of smudged cells on the mirror
     :return: answer for the puzzle
     """
-    vm = find_vertical_mirror(puzzle, old_ans)
-    if old_ans is not None and vm is not None:
-        vm = None if vm + 1 == old_ans else vm
-    if vm is None:
-        hm = find_horizontal_mirror(puzzle, old_ans)
-        if hm is None:
-            answer = 0
-        else:
-            answer = (hm + 1) * 100
-    else:
-        answer = vm + 1
-    return answer
+    vm = find_mirror(col_masks, smudges)
+    if vm is not None:
+        return vm
+    hm = find_mirror(row_masks, smudges)
+    return 0 if hm is None else hm * 100
 
 
-def correct_smudge(puzzle: np.ndarray) -> int:
+def correct_smudge(puzzle: np.ndarray, smudges: int = 1) -> int:
     """
     A smudge on the mirror which causes a different reflection line to be found - find the line after smudge correction
 
-    Iterate over columns and rows to find possible indices for the smudge:
-    These must be in a row or column which is different from another row/column in only one position
-    Then iterate over the indices, do the replacement and find the one which gives a new position for the mirror
+    Fixing the smudge makes the real mirror line perfect, so the real line is the one where exactly one cell differs
+    from its reflection. No need to try each possible smudge and solve the puzzle again.
 
     :param puzzle: input puzzle
+    :param smudges: number of smudged cells on the mirror
     :return: answer
     """
-    # get the original answer for comparison
-    first_ans = solve_puzzle(puzzle)
-
-    # get a list of possible indices for the smudge
-    idx = []
-    # based on columns
-    for i in range(puzzle.shape[0]):
-        for j in range(i, puzzle.shape[0]):
-            c1 = puzzle[i, :]
-            c2 = puzzle[j, :]
-            if np.sum(c1 == c2) == len(c1) - 1:
-                col_id = int(np.argwhere(c1 != c2)[0][0])
-                idx.extend([(i, col_id), (j, col_id)])
-
-    # based on rows
-    for i in range(puzzle.shape[1]):
-        for j in range(i, puzzle.shape[1]):
-            c1 = puzzle[:, i]
-            c2 = puzzle[:, j]
-            if np.sum(c1 == c2) == len(c1) - 1:
-                row_id = int(np.argwhere(c1 != c2)[0][0])
-                idx.extend([(row_id, i), (row_id, j)])
-
-    # find the solution for each possible index
-    ans = []
-    for i, j in idx:
-        replacement = "." if puzzle[i, j] == "#" else "#"
-        p = puzzle.copy()
-        p[i, j] = replacement
-        a = solve_puzzle(p, old_ans=first_ans)
-        if a > 0 and a != first_ans:
-            ans.append(a)
-    return [a for a in ans if a > 0 & a != first_ans][0]
+    return solve_puzzle(puzzle, smudges)
 
 
 def solve(data: List[str], part: str = "a") -> int:
@@ -205,9 +164,5 @@ def solve(data: List[str], part: str = "a") -> int:
     :param part: which part of the problem to solve - 'a' or 'b'
     :return: solution
     """
-    if part == "a":
-        puzzles = extract_puzzles(data)
-        return sum([solve_puzzle(format_puzzle(p)) for p in puzzles])
-    else:
-        puzzles = extract_puzzles(data)
-        return sum([correct_smudge(format_puzzle(p)) for p in puzzles])
+    smudges = 0 if part == "a" else 1
+    return sum(score_mirror(rows, cols, smudges) for rows, cols in get_all_masks(data))
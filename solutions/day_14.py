@@ -1,3 +1,4 @@
+from typing import Dict
 from typing import List
 from typing import Tuple
 
@@ -22,112 +23,148 @@ def view_map(puzzle: np.ndarray) -> None:
     plt.imshow(arr.astype("uint8"))
 
 
-def roll(arr: np.ndarray, ball: List[int], direction: str) -> np.ndarray:
+def tilt_north(rocks: np.ndarray, cubes: np.ndarray) -> np.ndarray:
+    """
+    Tilt the platform so that all the round rocks roll towards the top of the array
+
+    The cube rocks split each column into segments and every round rock in a segment ends up packed against the top
+    of it. So a rock's new row is the start of its segment plus the number of rocks above it in the segment. Counting
+    rocks with a cumulative sum down each column, the value at the cube rock above a segment is the count of rocks
+    before the segment, and a running maximum carries it (and the segment start) down the segment.
+
+    Example:
+    column [O, ., O, #, ., O] -> rank [1, 1, 2, 2, 2, 3] - before [0, 0, 0, 2, 2, 2] -> [O, O, ., #, O, .]
+    :param rocks: boolean array marking the round rocks
+    :param cubes: boolean array marking the cube rocks
+    :return: boolean array marking the round rocks after tilting
+    """
+    rows = np.arange(rocks.shape[0])[:, None]
+    rank = np.cumsum(rocks, axis=0)
+    before = np.maximum.accumulate(np.where(cubes, rank, 0), axis=0)
+    start = np.maximum.accumulate(np.where(cubes, rows + 1, 0), axis=0)
+    row, col = np.nonzero(rocks)
+    tilted = np.zeros_like(rocks)
+    tilted[start[row, col] + rank[row, col] - before[row, col] - 1, col] = True
+    return tilted
+
+
+def orient(arr: np.ndarray, direction: str) -> np.ndarray:
+    """
+    Flip and/or transpose the array so that the given direction becomes north
+    :param arr: input map
+    :param direction: north, south, east or west
+    :return: view of the map with direction pointing to the top
+    """
     match direction:
         case "north":
-            if ball[0] == 0:
-                return arr
-            while arr[ball[0] - 1, ball[1]] == ".":
-                arr[ball[0] - 1, ball[1]] = "O"
-                arr[ball[0], ball[1]] = "."
-                if ball[0] - 1 < 1:
-                    break
-                ball = [ball[0] - 1, ball[1]]
+            return arr
         case "south":
-            if ball[0] == arr.shape[0] - 1:
-                return arr
-            while arr[ball[0] + 1, ball[1]] == ".":
-                arr[ball[0] + 1, ball[1]] = "O"
-                arr[ball[0], ball[1]] = "."
-                if ball[0] + 1 == arr.shape[0] - 1:
-                    break
-                ball = [ball[0] + 1, ball[1]]
-        case "east":
-            if ball[1] == arr.shape[1] - 1:
-                return arr
-            while arr[ball[0], ball[1] + 1] == ".":
-                arr[ball[0], ball[1] + 1] = "O"
-                arr[ball[0], ball[1]] = "."
-                if ball[1] + 1 == arr.shape[1] - 1:
-                    break
-                ball = [ball[0], ball[1] + 1]
+            return arr[::-1]
         case "west":
-            if ball[1] == 0:
-                return arr
-            while arr[ball[0], ball[1] - 1] == ".":
-                arr[ball[0], ball[1] - 1] = "O"
-                arr[ball[0], ball[1]] = "."
-                if ball[1] - 1 < 1:
-                    break
-                ball = [ball[0], ball[1] - 1]
+            return arr.T
+        case "east":
+            return arr.T[::-1]
         case _:
             raise ValueError("Unexpected direction!")
-    return arr
 
 
-def run_cycle(arr_tup: Tuple[str, ...], shape: Tuple[int, ...]) -> np.ndarray:
+def tilt(arr: np.ndarray, direction: str) -> np.ndarray:
     """
-    Execute a cycle of titling N, W, S, E
+    Tilt the platform so that all the round rocks roll in the given direction
 
-    Note that order moving the round rocks is different for different tilting directions
-    :param arr_tup: input array as a tuple of strs
-    :param shape: shape of the array
-    :return: updated array
+    Every direction reuses tilt_north() by flipping and/or transposing the array so that the direction becomes north
+    :param arr: input map
+    :param direction: north, south, east or west
+    :return: new map after tilting
     """
-    arr = np.array(arr_tup).reshape(shape)
-    for d in ["north", "west", "south", "east"]:
-        round_balls = np.argwhere(arr == "O").tolist()
-        match d:
-            case "south":
-                round_balls = sorted(round_balls, key=lambda x: x[0], reverse=True)
-            case "east":
-                round_balls = sorted(round_balls, key=lambda x: x[1], reverse=True)
-            case "west":
-                round_balls = sorted(round_balls, key=lambda x: x[1], reverse=False)
-        for ball in round_balls:
-            arr = roll(arr, ball, d)
-    return arr
+    view = orient(arr, direction)
+    cubes = view == "#"
+    tilted = np.where(cubes, "#", np.where(tilt_north(view == "O", cubes), "O", "."))
+    match direction:
+        case "south":
+            tilted = tilted[::-1]
+        case "west":
+            tilted = tilted.T
+        case "east":
+            tilted = tilted[::-1].T
+    return tilted
+
+
+def build_segment_table(cubes: np.ndarray, direction: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Build the table for tilting the platform in the given direction
+
+    The cube rocks never move, so the segment each cell's rock slides along is fixed. Looking at the map with the
+    direction at the top, the segments are the runs of cells down each column between cube rocks. The cells are
+    listed segment by segment, each segment starting from the cell its rocks are packed against.
+
+    Example:
+    north, column [., ., #, .] -> segment of each cell [0, 0, -1, 1], cells [0, 1, 3], segment starts [0, 2]
+    :param cubes: boolean array marking the cube rocks
+    :param direction: north, south, east or west
+    :return: segment of each (flattened) cell, cells in segment order, index in the cells where each segment starts
+    """
+    view = orient(np.arange(cubes.size).reshape(cubes.shape), direction)
+    blocked = orient(cubes, direction)
+    # a segment starts at the top of each column and below each cube rock
+    starts = np.ones_like(blocked)
+    starts[1:] = blocked[:-1]
+    keep = ~blocked.T.ravel()
+    cells = view.T.ravel()[keep]
+    starts = starts.T.ravel()[keep]
+    segment_of = np.full(cubes.size, -1, dtype=np.int64)
+    segment_of[cells] = np.cumsum(starts) - 1
+    return segment_of, cells, np.flatnonzero(starts)
+
+
+def tilt_rocks(rocks: np.ndarray, table: Tuple[np.ndarray, np.ndarray, np.ndarray]) -> np.ndarray:
+    """
+    Tilt the platform using a table from build_segment_table()
+
+    Only the number of rocks in each segment matters - they fill the first cells of the segment. So the rocks are
+    counted per segment with bincount and scattered to the first cells of each segment, costing O(rocks + segments)
+    rather than a scan over every cell.
+    :param rocks: flattened indices of the round rocks
+    :param table: segment of each cell, cells in segment order, index in the cells where each segment starts
+    :return: flattened indices of the round rocks after tilting, in segment order
+    """
+    segment_of, cells, segment_starts = table
+    counts = np.bincount(segment_of[rocks], minlength=len(segment_starts))
+    segments = np.repeat(np.arange(len(segment_starts)), counts)
+    rank = np.arange(len(rocks)) - (np.cumsum(counts) - counts)[segments]
+    return cells[segment_starts[segments] + rank]
 
 
 def run_cycles(arr: np.ndarray, n: int) -> np.ndarray:
     """
     Run N cycles - when running the cycles, we check to see if the array gets into a loop
 
-    If a loop is detected, then can stop iterating and calculate where in the loop would stop after remaining steps
+    The tables for tilting in each direction are built once up front so each cycle only costs O(rocks). The sorted
+    rock positions are the key to a dict from each state seen to the cycle it was seen at. Once a state repeats, the
+    states since it form a loop, so the final state can be looked up without running the remaining cycles.
     :param arr: input starting array
     :param n: number of cycles to execute
     :return: final array
     """
-    arrs: List[np.ndarray] = [arr]
-    i = 0
-    for i in tqdm(range(n)):
-        arr = run_cycle(tuple(arr.flatten()), arr.shape)
-        if any(np.array_equal(arr, a) for a in arrs):
-            break
-        else:
-            arrs.append(arr)
-    first_el = [i for i, a in enumerate(arrs) if np.array_equal(a, arr)][0]
-    loop = arrs[first_el:]
-    final_idx = (n - i) % len(loop)
-    return loop[final_idx - 1]
-
-
-def roll_north(arr: np.ndarray, ball: List[int]) -> np.ndarray:
-    """
-    Roll a round ball starting at ball towards the top of the array
-    :param arr: the map
-    :param ball: the starting position of the ball
-    :return: new map after rolling the ball
-    """
-    if ball[0] == 0:  # nowhere to roll to!
-        return arr
-    while arr[ball[0] - 1, ball[1]] == ".":
-        arr[ball[0] - 1, ball[1]] = "O"
-        arr[ball[0], ball[1]] = "."
-        if ball[0] - 1 < 1:
+    cubes = arr == "#"
+    tables = [build_segment_table(cubes, d) for d in ("north", "west", "south", "east")]
+    rocks = np.flatnonzero(arr == "O")
+    seen: Dict[bytes, int] = {rocks.tobytes(): 0}
+    states = [rocks]
+    for i in tqdm(range(1, n + 1)):
+        for table in tables:
+            rocks = tilt_rocks(rocks, table)
+        rocks = np.sort(rocks)
+        key = rocks.tobytes()
+        if key in seen:
+            start = seen[key]
+            rocks = states[start + (n - start) % (i - start)]
             break
-        ball = [ball[0] - 1, ball[1]]
-    return arr
+        seen[key] = i
+        states.append(rocks)
+    final = np.where(cubes, "#", ".")
+    final.flat[rocks] = "O"
+    return final
 
 
 def use_north_lever(arr: np.ndarray) -> np.ndarray:
@@ -136,10 +173,7 @@ def use_north_lever(arr: np.ndarray) -> np.ndarray:
     :param arr: input map
     :return: new map after rolling
     """
-    round_balls = np.argwhere(arr == "O")
-    for ball in round_balls:
-        arr = roll_north(arr, ball)
-    return arr
+    return tilt(arr, "north")
 
 
 def calculate_load(arr: np.ndarray) -> int:
@@ -1,17 +1,7 @@
-from functools import cache
 from typing import List
 from typing import Tuple
 
-import tqdm
-
-
-def get_card_number(card: str) -> str:
-    """
-    Extract card number from the card string
-    :param card: card string
-    :return: the card number in form of "Card  x"
-    """
-    return card.split(": ")[0]
+import numpy as np
 
 
 def get_winning_numbers(card: str) -> List[int]:
@@ -24,24 +14,58 @@ def get_winning_numbers(card: str) -> List[int]:
     return list(map(int, winning_numbers))
 
 
-def get_trial_numbers(card: str) -> List[int]:
-    """
-    Extract the trial numbers from the card
-    :param card: input card data
-    :return: list of trial numbers
-    """
-    trial_numbers = card.split(" | ")[1].split()
-    return list(map(int, trial_numbers))
-
-
-def get_matches(winning_numbers: List[int], trial_numbers: List[int]) -> int:
-    """
-    Count the overlap between the winning numbers and trial numbers
-    :param winning_numbers: list of numbers
-    :param trial_numbers: list of numbers
-    :return: length of intersection
-    """
-    return len([x for x in trial_numbers if x in winning_numbers])
+def parse_cards(data: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Parse all the cards into two integer matrices with one row per card
+
+    Every card has the same number of winning and trial numbers so the numbers from all cards can be parsed in one go
+    and reshaped, with the first columns being the winning numbers and the remaining columns the trial numbers
+    :param data: input cards
+    :return: matrix of winning numbers, matrix of trial numbers
+    """
+    if not data:
+        return np.empty((0, 0), dtype=np.int32), np.empty((0, 0), dtype=np.int32)
+    n_winning = len(get_winning_numbers(data[0]))
+    numbers = np.fromstring(" ".join(card.split(": ")[1].replace("|", " ") for card in data), dtype=np.int32, sep=" ")
+    numbers = numbers.reshape(len(data), -1)
+    return numbers[:, :n_winning], numbers[:, n_winning:]
+
+
+def get_matches(
+    winning_numbers: np.ndarray, trial_numbers: np.ndarray, chunk_size: int = 16384, table_bytes: int = 2**24
+) -> np.ndarray:
+    """
+    Count the overlap between the winning numbers and trial numbers of every card at once
+
+    Each card gets a boolean lookup table (a bitset with one byte per number) with the winning numbers set, so checking
+    a trial number is a single lookup rather than a scan over the winning numbers. The tables for all cards in a chunk
+    are laid out end to end in one flat array, card i owning the slots i * size to (i + 1) * size. Cards are processed
+    in chunks so the tables stay within table_bytes and small enough to be cache resident. If the numbers are so large
+    that a single card's table would not fit, every trial number is compared against every winning number instead.
+
+    Example:
+    winning numbers [[1, 3]] -> table [[F, T, F, T, F]]
+    trial numbers [[3, 4, 1]] -> lookups [[T, F, T]] -> 2 matches
+    :param winning_numbers: matrix of winning numbers, one row per card
+    :param trial_numbers: matrix of trial numbers, one row per card
+    :param chunk_size: maximum number of cards to process at once
+    :param table_bytes: maximum size of the lookup tables for a chunk
+    :return: number of matches for each card
+    """
+    table_size = int(max(winning_numbers.max(initial=0), trial_numbers.max(initial=0))) + 1
+    chunk_size = max(1, min(chunk_size, table_bytes // table_size))
+    matches = np.empty(len(winning_numbers), dtype=np.int64)
+    for start in range(0, len(winning_numbers), chunk_size):
+        winning = winning_numbers[start : start + chunk_size]
+        trial = trial_numbers[start : start + chunk_size]
+        if table_size > table_bytes:
+            matches[start : start + chunk_size] = (trial[:, :, None] == winning[:, None, :]).any(axis=2).sum(axis=1)
+            continue
+        offsets = np.arange(len(winning), dtype=np.int64)[:, None] * table_size
+        table = np.zeros(len(winning) * table_size, dtype=bool)
+        table[(winning + offsets).ravel()] = True
+        matches[start : start + chunk_size] = np.count_nonzero(table[trial + offsets], axis=1)
+    return matches
 
 
 def score_cards(data: List[str]) -> int:
@@ -52,47 +76,45 @@ def score_cards(data: List[str]) -> int:
     :param data: input data
     :return: total score
     """
-    total = 0
-    for card in data:
-        n = get_matches(get_winning_numbers(card), get_trial_numbers(card))
-        if n > 0:
-            score = 2 ** (n - 1)
-            total += score
-    return total
+    matches = get_matches(*parse_cards(data))
+    return int((np.left_shift(1, matches) >> 1).sum())
 
 
-def get_card_id(card: str) -> int:
+def get_card_matches(data: List[str]) -> List[int]:
     """
-    Get just the numeric card ID from the card string
-    :param card: card string
-    :return: card ID
+    Parse each card once and count how many of its trial numbers are winning numbers
+    :param data: input cards
+    :return: number of matches for each card, in card order
     """
-    card_id = get_card_number(card)
-    return int(card_id.split("Card ")[1])
+    return get_matches(*parse_cards(data)).tolist()
 
 
-@cache
-def analyse_card(card: str, original_cards: Tuple[str]) -> int:
+def count_copies(matches: List[int]) -> List[int]:
     """
-    Recursive function for getting total cards per original starter card
+    Count how many copies of each card are held once all the won cards have been processed
+
+    Cards only ever win copies of later cards so a single forward pass is enough. Rather than adding the copies of
+    card i to each of the next n cards individually, the win is recorded in a difference array as +copies at i + 1 and
+    -copies at i + 1 + n. A running sum over the difference array then gives the number of extra copies of each card
+    so every card costs O(1) regardless of how many matches it has.
 
-    This funtion uses the cache dictionary to store the results of each card so each card only has to be
-    analysed once
-    :param card: card string
-    :param original_cards: the original cards list
-    :return: total number of cards received due to input card
+    Example:
+    matches = [4, 2, 2, 1, 0, 0] gives copies = [1, 2, 4, 8, 14, 1]
+    :param matches: number of matches for each card, in card order
+    :return: number of copies held of each card
     """
-    total = 0
-    current_idx = get_card_id(card)
-    n = get_matches(get_winning_numbers(card), get_trial_numbers(card))
-    total += n
-    if n > 0:
-        new_cards = [
-            c for c in original_cards if any([get_card_id(c) == i for i in range(current_idx + 1, current_idx + 1 + n)])
-        ]
-        for new_card in new_cards:
-            total += analyse_card(new_card, original_cards)
-    return total
+    n_cards = len(matches)
+    diff = [0] * (n_cards + 1)
+    copies = []
+    won = 0
+    for i, n in enumerate(matches):
+        won += diff[i]
+        held = won + 1
+        copies.append(held)
+        if n > 0:
+            diff[i + 1] += held
+            diff[min(i + 1 + n, n_cards)] -= held
+    return copies
 
 
 def count_cards(data: List[str]) -> int:
@@ -101,12 +123,7 @@ def count_cards(data: List[str]) -> int:
     :param data: input starter cards
     :return: total number of cards
     """
-    original_cards = tuple(data.copy())
-    totals = []
-    for card in tqdm.tqdm(data):
-        card_total = analyse_card(card, original_cards)
-        totals.append(card_total)
-    return sum(totals) + len(data)
+    return sum(count_copies(get_card_matches(data)))
 
 
 def solve(data: List[str], part: str = "a") -> int:
@@ -1,28 +1,236 @@
-import itertools
-from collections import deque
-from typing import Deque
+from bisect import bisect_left
+from bisect import bisect_right
+from dataclasses import dataclass
+from functools import reduce
 from typing import Dict
+from typing import Iterator
 from typing import List
-from typing import Optional
 from typing import Tuple
+from typing import Union
 
-import tqdm
+import numpy as np
 
 
-def map_value(value: int, dest_start: int, source_start: int, range: int) -> Optional[int]:
+class IntervalSet:
     """
-    Map the provided value from the source space to the destination space
+    A set of integers stored as sorted, non-overlapping half open intervals [start, end)
 
-    If the value does not lie within the provided ranges then None is returned
-    :param value: input value from source space
-    :param dest_start: the start of the destination space
-    :param source_start: the start of the source space
-    :param range: the range of the source and destination spaces
-    :return: mapped value
+    The interval bounds are held in two int64 arrays so that operations on the set are vectorised over all of its
+    intervals. On construction the intervals are sorted and any which overlap or touch are coalesced, which keeps the
+    number of intervals as small as possible however many ranges are added to the set.
+
+    Example:
+    IntervalSet.from_ranges([(5, 8), (0, 3), (3, 4), (6, 10)]) -> [(0, 4), (5, 10)]
     """
-    if source_start <= value <= source_start + range:
-        return dest_start + (value - source_start)
-    return None
+
+    def __init__(self, starts: np.ndarray, ends: np.ndarray, coalesce: bool = True) -> None:
+        """
+        Initialise the IntervalSet
+
+        :param starts: interval starts (inclusive)
+        :param ends: interval ends (exclusive)
+        :param coalesce: if False then the intervals must already be sorted and disjoint and are kept as they are
+        """
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends, dtype=np.int64)
+        if coalesce:
+            starts, ends = self.coalesce(starts, ends)
+        self.starts: np.ndarray = starts
+        self.ends: np.ndarray = ends
+
+    @staticmethod
+    def coalesce(starts: np.ndarray, ends: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Sort the intervals and merge any which overlap or touch
+
+        After sorting by start, an interval begins a new group if it starts after the furthest end seen so far. The
+        groups are then reduced to one interval each.
+        :param starts: interval starts
+        :param ends: interval ends
+        :return: coalesced starts, coalesced ends
+        """
+        keep = starts < ends
+        order = np.argsort(starts[keep], kind="stable")
+        starts = starts[keep][order]
+        ends = ends[keep][order]
+        if len(starts) == 0:
+            return starts, ends
+        new_group = np.ones(len(starts), dtype=bool)
+        new_group[1:] = starts[1:] > np.maximum.accumulate(ends)[:-1]
+        group_starts = np.flatnonzero(new_group)
+        return starts[group_starts], np.maximum.reduceat(ends, group_starts)
+
+    @classmethod
+    def from_ranges(cls, ranges: List[Tuple[int, int]]) -> "IntervalSet":
+        """
+        Create an IntervalSet from a list of (start, end) tuples
+        :param ranges: half open ranges
+        :return: IntervalSet covering all the ranges
+        """
+        bounds = np.array(ranges, dtype=np.int64).reshape(-1, 2)
+        return cls(bounds[:, 0], bounds[:, 1])
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        return zip(self.starts.tolist(), self.ends.tolist())
+
+    def __repr__(self) -> str:
+        return f"IntervalSet({list(self)})"
+
+    def split(self, points: Union[List[int], np.ndarray]) -> "IntervalSet":
+        """
+        Split the intervals at each of the given points
+
+        The result covers exactly the same values but is deliberately not coalesced, so that every piece lies between
+        two consecutive points and can be shifted on its own.
+
+        Example:
+        [(0, 10)] split at [3, 5, 20] -> [(0, 3), (3, 5), (5, 10)]
+        :param points: sorted split points
+        :return: uncoalesced IntervalSet of the pieces
+        """
+        points = np.asarray(points, dtype=np.int64)
+        if len(points) == 0 or len(self) == 0:
+            return self
+        first = np.searchsorted(points, self.starts, side="right")
+        n_inside = np.searchsorted(points, self.ends, side="left") - first
+        n_pieces = n_inside + 1
+        interval = np.repeat(np.arange(len(self)), n_pieces)
+        rank = np.arange(n_pieces.sum()) - np.repeat(np.cumsum(n_pieces) - n_pieces, n_pieces)
+        point_idx = first[interval] + rank
+        starts = np.where(rank == 0, self.starts[interval], points[np.clip(point_idx - 1, 0, len(points) - 1)])
+        ends = np.where(rank == n_inside[interval], self.ends[interval], points[np.minimum(point_idx, len(points) - 1)])
+        return IntervalSet(starts, ends, coalesce=False)
+
+    def shift(self, offsets: Union[int, np.ndarray]) -> "IntervalSet":
+        """
+        Shift the intervals, either all by the same amount or each by its own offset
+        :param offsets: a single offset or an array with one offset per interval
+        :return: coalesced IntervalSet of the shifted intervals
+        """
+        return IntervalSet(self.starts + offsets, self.ends + offsets)
+
+    def union(self, other: "IntervalSet") -> "IntervalSet":
+        """
+        Combine two IntervalSets
+        :param other: the other set
+        :return: coalesced IntervalSet covering both
+        """
+        return IntervalSet(np.concatenate([self.starts, other.starts]), np.concatenate([self.ends, other.ends]))
+
+
+@dataclass
+class PiecewiseLinearMap:
+    """
+    An integer function made up of pieces where each piece shifts its values by a constant offset
+
+    The pieces are described by the sorted breakpoints. Piece i covers the values [breakpoints[i - 1], breakpoints[i])
+    and maps them by adding offsets[i], where the first piece extends down to -inf and the last piece extends up to
+    +inf. There is therefore always one more offset than there are breakpoints.
+
+    Example:
+    breakpoints = [50, 98, 100] and offsets = [0, 2, -48, 0]
+    49 -> 49, 50 -> 52, 97 -> 99, 98 -> 50, 100 -> 100
+    """
+
+    breakpoints: List[int]
+    offsets: List[int]
+
+    @classmethod
+    def from_mappings(cls, mappings: List[str]) -> "PiecewiseLinearMap":
+        """
+        Build the function from the puzzle mapping lines
+
+        Each mapping line is "dest_start source_start length". Values not covered by any line map to themselves.
+        :param mappings: the mapping lines for one space transformation
+        :return: the function for the transformation
+        """
+        ranges = sorted(
+            (source_start, source_start + length, dest_start - source_start)
+            for dest_start, source_start, length in (map(int, m.split()) for m in mappings)
+        )
+        breakpoints: List[int] = []
+        offsets = [0]
+        for start, end, offset in ranges:
+            if breakpoints and breakpoints[-1] == start:
+                offsets[-1] = offset
+            else:
+                breakpoints.append(start)
+                offsets.append(offset)
+            breakpoints.append(end)
+            offsets.append(0)
+        return cls(breakpoints, offsets).simplify()
+
+    def simplify(self) -> "PiecewiseLinearMap":
+        """
+        Remove any breakpoints which separate two pieces with the same offset
+        :return: equivalent function with the fewest breakpoints
+        """
+        breakpoints = []
+        offsets = [self.offsets[0]]
+        for point, offset in zip(self.breakpoints, self.offsets[1:]):
+            if offset != offsets[-1]:
+                breakpoints.append(point)
+                offsets.append(offset)
+        return PiecewiseLinearMap(breakpoints, offsets)
+
+    def offset_at(self, value: int) -> int:
+        """
+        Find the offset of the piece containing value
+        :param value: input value
+        :return: offset applied to value
+        """
+        return self.offsets[bisect_right(self.breakpoints, value)]
+
+    def __call__(self, value: int) -> int:
+        """
+        Map a single value
+        :param value: input value
+        :return: mapped value
+        """
+        return value + self.offset_at(value)
+
+    def then(self, other: "PiecewiseLinearMap") -> "PiecewiseLinearMap":
+        """
+        Compose two functions into one which applies self and then other
+
+        The composed function needs a breakpoint wherever self has one, plus wherever a piece of self maps a value onto
+        a breakpoint of other. For each piece of self the breakpoints of other which land inside its image are found by
+        bisection and translated back into the domain of self.
+
+        Example:
+        self shifts everything >= 10 by +5 and other shifts everything >= 20 by +100
+        The composed function has breakpoints at 10 (from self) and 15 (as 15 -> 20 under self)
+        :param other: the function to apply second
+        :return: the composed function
+        """
+        breakpoints = set(self.breakpoints)
+        lows = [None, *self.breakpoints]
+        highs = [*self.breakpoints, None]
+        for low, high, offset in zip(lows, highs, self.offsets):
+            first = 0 if low is None else bisect_right(other.breakpoints, low + offset)
+            last = len(other.breakpoints) if high is None else bisect_left(other.breakpoints, high + offset)
+            breakpoints.update(b - offset for b in other.breakpoints[first:last])
+        sorted_breakpoints = sorted(breakpoints)
+        offsets = [self.offsets[0] + other.offsets[0]]
+        offsets.extend(self.offset_at(b) + other.offset_at(self(b)) for b in sorted_breakpoints)
+        return PiecewiseLinearMap(sorted_breakpoints, offsets).simplify()
+
+    def map_intervals(self, intervals: IntervalSet) -> IntervalSet:
+        """
+        Map every value in an IntervalSet
+
+        The intervals are split at the breakpoints so that each piece lies within a single piece of the function, then
+        each piece is shifted by the offset of the function piece it lies in. The result is coalesced, so it never holds
+        more intervals than the input plus the breakpoints.
+        :param intervals: input values
+        :return: mapped values
+        """
+        pieces = intervals.split(self.breakpoints)
+        piece_ids = np.searchsorted(np.array(self.breakpoints, dtype=np.int64), pieces.starts, side="right")
+        return pieces.shift(np.array(self.offsets, dtype=np.int64)[piece_ids])
 
 
 def clean_input(data: List[str]) -> Tuple[List[int], List[str]]:
@@ -55,123 +263,46 @@ def create_maps(data: List[str]) -> Dict[str, List[str]]:
     return maps
 
 
-def map_seed(seed: int, maps: Dict[str, List[str]]) -> int:
+def create_map_arrays(mappings: List[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
     """
-    Map seed to location by iterating over the transformations stored within maps
-    :param seed: the seed ID
-    :param maps: the dictionary of mappings
-    :return: the seed location
+    Convert the mapping lines for one space transformation into sorted arrays for batch mapping
+    :param mappings: the mapping lines, each "dest_start source_start length"
+    :return: source range starts (sorted), source range ends (exclusive), offsets to add within each range
     """
-    current_value = seed
-    for m, mappings in maps.items():
-        mapped_value = None
-        for mapping in mappings:
-            mapping_vals = list(map(int, mapping.split()))
-            mapped_value = map_value(current_value, *mapping_vals)
-            if mapped_value is not None:
-                break
-        if mapped_value is not None:
-            current_value = mapped_value
-    return current_value
+    values = np.array([list(map(int, m.split())) for m in mappings], dtype=np.int64).reshape(-1, 3)
+    dest_starts, source_starts, lengths = values[np.argsort(values[:, 1])].T
+    return source_starts, source_starts + lengths, dest_starts - source_starts
 
 
-def ranges_overlap(range1: List[int], range2: List[int]) -> bool:
+def map_seeds(seeds: np.ndarray, map_arrays: List[Tuple[np.ndarray, np.ndarray, np.ndarray]]) -> np.ndarray:
     """
-    Check if there is any overlap between the two number specified number ranged
-    :param range1: a range of numbers described by start:end
-    :param range2: a range of numbers described by start:end
-    :return: True if the ranges overlap
-    """
-    overlap = not (range1[1] < range2[0] or range2[1] < range1[0])
-    return overlap
-
+    Map a whole array of seeds to locations, one space transformation at a time
 
-def map_range(r: List[int], m: List[int]) -> Tuple[Tuple[int, int] | Tuple, List[List[int]]]:
+    For each transformation, np.searchsorted finds the last source range starting at or before each value. The offset
+    of that range is added only where the value also lies before the end of the range, otherwise it is unmapped.
+    :param seeds: array of seed IDs
+    :param map_arrays: the arrays from create_map_arrays() for each transformation, in order
+    :return: array of seed locations
     """
-    Map a number range r to a new space using a mapping m. Unmappable ranges are returned as the remainder
-
-    Mapping m is a list of three numbers as follows:
-    Entry 0: start of the destination space
-    Entry 1: start of the source space
-    Entry 2: length of the source and destination spaces
+    values = seeds.astype(np.int64)
+    for starts, ends, offsets in map_arrays:
+        if len(starts) == 0:
+            continue
+        idx = np.searchsorted(starts, values, side="right") - 1
+        clipped = np.maximum(idx, 0)
+        mapped = (idx >= 0) & (values < ends[clipped])
+        values = values + np.where(mapped, offsets[clipped], 0)
+    return values
 
-    If the ranges do not overlap then an empty tuple is returned for mapped space and the original source space is
-    returned as the remainder
 
-    Example:
-    let r=[10, 20] and m = [30, 5, 10]
-    The range of numbers 10->20 is partially covered by the source space 5->14
-    Numbers 10->14 can be mapped to the destination space and become 35->39
-    Numbers 15->20 cannot be mapped using this mapping and so would be returned as a remainder
-    For this example, the function would return (35, 39), [[15, 20]]
-
-    :param r: input space e.g. [10, 20]
-    :param m: input mapping e.g. [30, 5, 10]
-    :return: the mapped range, the remainder ranges
-    """
-    buckets = []
-    if not ranges_overlap(r, [m[1], m[1] + m[2] - 1]):
-        return (), [r]
-    if r[0] < m[1]:
-        lower_remainder = [r[0], m[1] - 1]
-        mappable_l = m[1]
-        buckets.append(lower_remainder)
-    else:
-        mappable_l = r[0]
-    if r[1] > m[1] + m[2] - 1:
-        upper_remainder = [m[1] + m[2], r[1]]
-        mappable_h = m[1] + m[2] - 1
-        buckets.append(upper_remainder)
-    else:
-        mappable_h = r[1]
-    mappable_range = (map_value(mappable_l, *m), map_value(mappable_h, *m))
-    if None in mappable_range:
-        raise ValueError("Should not get None in the mapped range here")
-    return mappable_range, buckets
-
-
-def map_seed_b(seed_low: int, seed_high: int, maps: Dict[str, List[str]]) -> int:
+def compile_maps(maps: Dict[str, List[str]]) -> PiecewiseLinearMap:
     """
-    Map seed range to locations by iterating over the transformations stored within maps
-
-    :param seed_low: the seed ID range lower bound
-    :param seed_high: the seed ID range upper bound
+    Compose all the space transformations into a single seed to location function
     :param maps: the dictionary of mappings
-    :return: the lowest seed location
-    """
-    ranges: List[Tuple[int, int] | Tuple] = [(seed_low, seed_high)]
-    for m_name, mappings in maps.items():
-        formatted_mappings = [list(map(int, m.split())) for m in mappings]
-        remainders: Deque = deque()
-        remainders.extend(ranges)
-        new_ranges = []
-        while len(remainders) > 0:
-            r = remainders.popleft()
-            did_map = False
-            for m in formatted_mappings:
-                mapped, rms = map_range(r, m)
-                if len(mapped) > 0 and len(rms) == 0:  # all mapped
-                    new_ranges.append(mapped)
-                    did_map = True
-                    break
-                if len(mapped) > 0 and len(rms) > 0:  # partial mapped
-                    new_ranges.append(mapped)
-                    remainders.extend(rms)
-                    did_map = True
-                    break
-            if not did_map:
-                remainders.append(r)
-            if not any(
-                ranges_overlap(r, [m[1], m[2] + m[1] - 1]) for r, m in itertools.product(remainders, formatted_mappings)
-            ):
-                new_ranges.extend(remainders)
-                remainders.clear()
-                break
-            formatted_mappings.reverse()
-        ranges = new_ranges
-
-    min_vals = [min(r) for r in ranges]
-    return min(min_vals)
+    :return: seed to location function
+    """
+    functions = [PiecewiseLinearMap.from_mappings(mappings) for mappings in maps.values()]
+    return reduce(PiecewiseLinearMap.then, functions, PiecewiseLinearMap([], [0]))
 
 
 def get_closest_location(data: List[str]) -> int:
@@ -181,28 +312,20 @@ def get_closest_location(data: List[str]) -> int:
     :return: smallest location
     """
     seeds, clean_data = clean_input(data)
-    maps = create_maps(clean_data)
-    locations = []
-    for seed in tqdm.tqdm(seeds):
-        l = map_seed(seed, maps)
-        locations.append(l)
-    return min(locations)
+    map_arrays = [create_map_arrays(mappings) for mappings in create_maps(clean_data).values()]
+    return int(map_seeds(np.array(seeds, dtype=np.int64), map_arrays).min())
 
 
 def get_closest_location_b(data: List[str]) -> int:
     """
-    Across the seeds, find the one with the smallest location value
+    Across the seed ranges, find the one with the smallest location value
     :param data: input data
     :return: smallest location
     """
     seeds, clean_data = clean_input(data)
-    seed_groups = [(x, seeds[i + 1]) for i, x in enumerate(seeds) if i % 2 == 0]
-    maps = create_maps(clean_data)
-    locations = []
-    for seed_l, r in tqdm.tqdm(seed_groups):
-        l = map_seed_b(seed_l, seed_l + r, maps)
-        locations.append(l)
-    return min(locations)
+    seed_ranges = IntervalSet.from_ranges([(start, start + length) for start, length in zip(seeds[::2], seeds[1::2])])
+    locations = compile_maps(create_maps(clean_data)).map_intervals(seed_ranges)
+    return int(locations.starts[0])
 
 
 def solve(data: List[str], part: str = "a") -> int:
@@ -1,6 +1,7 @@
 import math
 from typing import List
-from typing import Tuple
+
+import numpy as np
 
 
 def get_times(data: List[str]) -> List[int]:
@@ -21,99 +22,54 @@ def get_distances(data: List[str]) -> List[int]:
     return list(map(int, data[1].split(": ")[1].split()))
 
 
-def get_distance(speed: int, time: int) -> int:
-    """
-    Calculate distance from speed and time
-    :param speed: boat speed
-    :param time: time for travel
-    :return: distance travelled
-    """
-    return speed * time
-
-
-def find_strategies(max_time: int) -> List[Tuple[int, int]]:
-    """
-    Find all strategies for a given race
-
-    A strategy consists of how much time spent holding the button and how much time moving
-    This functions returns a list of tuples where each tuple is a strategy. The first entry to the tuple is the
-    time spent holding the button (equates to speed) and the second element is the time left for moving
-    :param max_time: time limit of the race
-    :return: possible strategies
+def count_winning_strategies(max_time: int, record_distance: int) -> int:
     """
-    return [(i, max_time - i) for i in range(1, max_time)]
+    Count the number of ways to beat the record distance in a race
 
+    Holding the button for h gives a distance of h * (max_time - h), so the winning strategies are the integers h
+    strictly between the roots of h^2 - max_time * h + record_distance = 0, which are symmetric about max_time / 2.
+    With r = isqrt(max_time^2 - 4 * record_distance), (max_time - r) // 2 is either the smallest winning h or one
+    below it, so a single exact check finds the first winning strategy and the count follows from the symmetry.
+    Everything stays in integer arithmetic, so this is exact for races of any size.
 
-def find_winnning_strategies(max_time: int, record_distance: int) -> int:
-    """
-    Collect possible strategies and determine which ones would beat the record distance. Return number of winning
-    strategies
+    Example:
+    max_time = 7, record_distance = 9 -> r = isqrt(13) = 3 -> h = 2 wins (10 > 9) -> wins for h = 2 to 5 -> 4
     :param max_time: time limit for the race
     :param record_distance: distance to beat
     :return: number of winning strategies
     """
-    strategies = find_strategies(max_time)
-    distances = [get_distance(*s) for s in strategies]
-    return [d > record_distance for d in distances].count(True)
-
-
-def generate_ranges(big_number: int, step: int, start: int = 0) -> List[Tuple[int, int]]:
-    """
-    Split a big number up into a list of ranges which cover the range of 0 to big number
-
-    Example:
-    The number 100 could be represented as a list of ranges each of step 10
-
-    :param big_number: the number to split up
-    :param step: the step size to use for ranges
-    :param start: the starting number to use
-    :return: list of ranges
-    """
-    ranges = []
-
-    for s in range(start, big_number, step):
-        end = min(s + step, big_number)
-        ranges.append((s, end))
-
-    return ranges
-
-
-def test_range(r: Tuple[int, int], d: int, step: int, max_time: int) -> int:
-    """
-    Test to see if a range beats the distance d
-
-    It is safe to assume that if the start of the range and the end of the range have the same result then all
-    values between will have the same result
-    :param r: input range (start, finish)
-    :param d: the distance to beat
-    :param step: the step size
-    :param max_time: the max time allowed
-    :return: number of strategies which beat d
-    """
-    lower = get_distance(r[0], max_time - r[0]) > d
-    upper = get_distance(r[1], max_time - r[1]) > d
-    if lower and upper:
-        return step
-    if not lower and not upper:
+    discriminant = max_time * max_time - 4 * record_distance
+    if discriminant < 0:
         return 0
-    return sum([get_distance(t, max_time - t) > d for t in range(r[0], r[1])])
+    first = (max_time - math.isqrt(discriminant)) // 2
+    if first * (max_time - first) <= record_distance:
+        first += 1
+    return max(0, max_time - 2 * first + 1)
 
 
-def solve_big_race(max_time: int, record_distance: int, step: int, start: int = 1) -> int:
+def count_winning_strategies_batch(max_times: List[int], record_distances: List[int]) -> np.ndarray:
     """
-    Solution for part b - the big race where it is inefficient to try every possible strategy
+    Count the number of ways to beat the record distance for many races at once
 
-    Instead split the time limit into buckets and only do a detailed check on buckets where the bottom and top of the
-    range do not give the same answer
-    :param max_time: time limit for the race
-    :param record_distance: distance to beat
-    :param step: step size for buckets
-    :param start: starting value to use
-    :return: number of winning strategies
+    When the squared times and distances fit in int64 the races are solved together with NumPy, taking a float square
+    root and correcting it to the exact integer square root. Otherwise each race is solved with Python ints.
+    :param max_times: time limits for the races
+    :param record_distances: distances to beat
+    :return: number of winning strategies for each race
     """
-    buckets = generate_ranges(max_time, step, start)
-    ns = [test_range(r, record_distance, step, max_time) for r in buckets]
-    return sum(ns)
+    if max(max_times, default=0) < 2**31 and max(record_distances, default=0) < 2**60:
+        times = np.array(max_times, dtype=np.int64)
+        distances = np.array(record_distances, dtype=np.int64)
+        discriminant = times * times - 4 * distances
+        root = np.sqrt(np.maximum(discriminant, 0)).astype(np.int64)
+        root = np.where(root * root > discriminant, root - 1, root)
+        root = np.where((root + 1) * (root + 1) <= discriminant, root + 1, root)
+        first = (times - root) // 2
+        first = np.where(first * (times - first) <= distances, first + 1, first)
+        return np.where(discriminant < 0, 0, np.maximum(0, times - 2 * first + 1))
+    return np.frompyfunc(count_winning_strategies, 2, 1)(
+        np.array(max_times, dtype=object), np.array(record_distances, dtype=object)
+    )
 
 
 def solve(data: List[str], part: str = "a") -> int:
@@ -126,8 +82,8 @@ def solve(data: List[str], part: str = "a") -> int:
     if part == "a":
         times = get_times(data)
         distances = get_distances(data)
-        return math.prod([find_winnning_strategies(t, d) for t, d in zip(times, distances)])
+        return int(math.prod(count_winning_strategies_batch(times, distances).tolist()))
     else:
         max_time = int("".join(map(str, get_times(data))))
         max_distance = int("".join(map(str, get_distances(data))))
-        return solve_big_race(max_time=max_time, record_distance=max_distance, step=1000)
+        return count_winning_strategies(max_time=max_time, record_distance=max_distance)
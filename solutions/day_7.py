@@ -1,9 +1,15 @@
-import functools
 from collections import Counter
+from typing import Dict
 from typing import List
+from typing import Optional
+from typing import Tuple
+
+import numpy as np
 
 CARDS = ["A", "K", "Q", "J", "T", "9", "8", "7", "6", "5", "4", "3", "2"]
 CARDS_JOKER = ["A", "K", "Q", "T", "9", "8", "7", "6", "5", "4", "3", "2", "J"]
+CARD_VALUES = {card: value for value, card in enumerate(reversed(CARDS))}
+CARD_VALUES_JOKER = {card: value for value, card in enumerate(reversed(CARDS_JOKER))}
 RANK_TYPES = {
     "five of kind": 6,
     "four of kind": 5,
@@ -13,84 +19,131 @@ RANK_TYPES = {
     "one pair": 1,
     "high card": 0,
 }
+RANK_SIGNATURES = {
+    (5,): "five of kind",
+    (4, 1): "four of kind",
+    (3, 2): "full house",
+    (3, 1, 1): "three of kind",
+    (2, 2, 1): "two pairs",
+    (2, 1, 1, 1): "one pair",
+    (1, 1, 1, 1, 1): "high card",
+}
+RANK_SIGNATURE_VALUES = {signature: RANK_TYPES[name] for signature, name in RANK_SIGNATURES.items()}
 
 
 def get_rank_type(hand: str, jokers: bool = False) -> str:
     """
     Get the rank type of the hand
+
+    The rank type only depends on the signature of the hand - the card counts sorted from most to least common.
+    Jokers always do best by copying the most common other card, so they are added to the top count of the signature.
     :param hand: the input hand of cards
     :param jokers: whether jokers are in the deck
     :return: the rank type name
     """
     counts = Counter(hand)
-    n_jokers = counts.get("J", 0) if jokers else 0
-    if n_jokers == 5:
-        return "five of kind"
-    if n_jokers > 0:
-        _ = counts.pop("J")
-    max_n = max(counts.values())
-    if max_n == 5:
-        return "five of kind"
-    if max_n == 4:
-        if n_jokers > 0:
-            return "five of kind"
-        return "four of kind"
-    if max_n == 3 and 2 in counts.values():
-        if n_jokers == 1:
-            return "four of kind"
-        if n_jokers > 1:
-            return "five of kind"
-        return "full house"
-    if max_n == 3:
-        if n_jokers == 1:
-            return "four of kind"
-        if n_jokers > 1:
-            return "five of kind"
-        return "three of kind"
-    if list(counts.values()).count(2) == 2:
-        if n_jokers == 1:
-            return "full house"
-        if n_jokers == 2:
-            return "four of kind"
-        if n_jokers > 2:
-            return "five of kind"
-        return "two pairs"
-    if max_n == 2:
-        if n_jokers == 1:
-            return "three of kind"
-        if n_jokers == 2:
-            return "four of kind"
-        if n_jokers > 2:
-            return "five of kind"
-        return "one pair"
-    if n_jokers == 1:
-        return "one pair"
-    if n_jokers == 2:
-        return "three of kind"
-    if n_jokers == 3:
-        return "four of kind"
-    if n_jokers > 3:
-        return "five of kind"
-    return "high card"
-
-
-def compare_hands_of_same_type(jokers: bool, hand1: str, hand2: str) -> int:
-    """
-    If two hands have the same rank type - they can be split by comparing high cards from start of the hand
-
-    This function is used as a custom sorting function with sorted()
+    n_jokers = counts.pop("J", 0) if jokers else 0
+    signature = sorted(counts.values(), reverse=True) or [0]
+    signature[0] += n_jokers
+    return RANK_SIGNATURES[tuple(signature)]
+
+
+def get_signature_table(
+    signatures: Dict[Tuple[int, ...], int], hand_size: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Build a lookup table from count signatures to rank type values for use with NumPy
+
+    Each signature is padded with zeros to hand_size counts and encoded as a base hand_size + 1 number
+    :param signatures: mapping of count signatures to rank type values
+    :param hand_size: number of cards in a hand
+    :return: place values for encoding a signature, sorted signature codes, rank type value of each code
+    """
+    place_values = (hand_size + 1) ** np.arange(hand_size - 1, -1, -1, dtype=np.int64)
+    codes = np.array([np.dot([*s, *[0] * (hand_size - len(s))], place_values) for s in signatures], dtype=np.int64)
+    types = np.array(list(signatures.values()), dtype=np.int64)
+    order = np.argsort(codes)
+    return place_values, codes[order], types[order]
+
+
+def encode_hands(hands: List[str], card_values: Dict[str, int]) -> np.ndarray:
+    """
+    Convert a list of hands to a matrix of card values with one row per hand
+
+    A card which is not in card_values raises a ValueError.
+    :param hands: the list of hands, all of the same size
+    :param card_values: mapping of each card to its value
+    :return: matrix of card values
+    """
+    lookup = np.full(256, -1, dtype=np.int64)
+    for card, value in card_values.items():
+        lookup[ord(card)] = value
+    chars = np.frombuffer("".join(hands).encode(), dtype=np.uint8)
+    cards = lookup[chars]
+    if (cards < 0).any():
+        unknown = next(card for card in "".join(hands) if card not in card_values)
+        raise ValueError(f"Unknown card {unknown}!")
+    return cards.reshape(len(hands), -1)
+
+
+def classify_hands(
+    cards: np.ndarray,
+    n_values: int,
+    wildcard: Optional[int] = None,
+    signatures: Optional[Dict[Tuple[int, ...], int]] = None,
+) -> np.ndarray:
+    """
+    Get the rank type value of every hand at once, as get_rank_type() does for a single hand
+
+    The cards of each hand are counted per value, the counts sorted into the hand's signature with any wildcards added
+    to the top count, and the signature looked up in the table of known signatures. A signature which is not in the
+    table raises a ValueError.
+    :param cards: matrix of card values, one row per hand
+    :param n_values: number of distinct card values
+    :param wildcard: value of the wildcard card, if there is one
+    :param signatures: mapping of count signatures to rank type values, defaults to RANK_SIGNATURE_VALUES
+    :return: rank type value of each hand
+    """
+    signatures = RANK_SIGNATURE_VALUES if signatures is None else signatures
+    hand_size = cards.shape[1]
+    counts = np.zeros((len(cards), n_values), dtype=np.int64)
+    for i in range(hand_size):
+        counts[np.arange(len(cards)), cards[:, i]] += 1
+    n_wild = np.zeros(len(cards), dtype=np.int64)
+    if wildcard is not None:
+        n_wild = counts[:, wildcard].copy()
+        counts[:, wildcard] = 0
+    signature = -np.sort(-counts, axis=1)[:, :hand_size]
+    signature[:, 0] += n_wild
+    place_values, codes, types = get_signature_table(signatures, hand_size)
+    hand_codes = signature @ place_values
+    idx = np.minimum(np.searchsorted(codes, hand_codes), len(codes) - 1)
+    unknown = codes[idx] != hand_codes
+    if unknown.any():
+        raise ValueError(f"Unknown hand signature {signature[np.argmax(unknown)].tolist()}!")
+    return types[idx]
+
+
+def get_hand_keys(hands: List[str], jokers: bool = False) -> np.ndarray:
+    """
+    Encode each hand as a single integer which sorts in the same order as the strength of the hands
+
+    The rank type is stored in the high bits and below it each card's value takes 4 bits, with the first card in
+    the most significant position. Comparing two keys therefore compares the rank types first and then the cards
+    from the start of the hand, exactly as the puzzle ranks hands.
+
+    Example:
+    "32T3K" is one pair (1) with card values 1, 0, 8, 1, 11 -> 0x1_1_0_8_1_B
+    :param hands: the list of hands
     :param jokers: whether jokers are in the deck
-    :param hand1: first hand to compare
-    :param hand2: second hand to compare
-    :return: 1 if hand1 > hand2 else -1
+    :return: integer sort key of each hand
     """
-    card_ranks = CARDS_JOKER if jokers else CARDS
-    for c1, c2 in zip(list(hand1), list(hand2)):
-        if card_ranks.index(c1) < card_ranks.index(c2):
-            return -1
-        if card_ranks.index(c2) < card_ranks.index(c1):
-            return 1
-    raise ValueError("Cannot distinguish two hands!")
+    card_values = CARD_VALUES_JOKER if jokers else CARD_VALUES
+    cards = encode_hands(hands, card_values)
+    keys = classify_hands(cards, len(card_values), card_values["J"] if jokers else None)
+    for i in range(cards.shape[1]):
+        keys = (keys << 4) | cards[:, i]
+    return keys
 
 
 def rank_hands(hands: List[str], jokers: bool = False) -> List[str]:
@@ -100,47 +153,23 @@ def rank_hands(hands: List[str], jokers: bool = False) -> List[str]:
     :param jokers: whether jokers are in the deck
     :return: a ranked list of hands
     """
-    hand_types = [get_rank_type(h, jokers) for h in hands]
-    hand_values = [RANK_TYPES[r] for r in hand_types]
-
-    combined = list(zip(hands, hand_values))
-
-    # Sort the combined list based on scores in descending order
-    sorted_combined = sorted(combined, key=lambda x: x[1], reverse=True)
-
-    # Separate the sorted pairs back into two lists
-    sorted_hands, sorted_scores = zip(*sorted_combined)
-
-    final_ranking = []
-    for score in RANK_TYPES.values():
-        if score in sorted_scores:
-            idx = [i for i, s in enumerate(sorted_scores) if s == score]
-            if len(idx) == 0:
-                pass
-            elif len(idx) == 1:
-                final_ranking.append(sorted_hands[idx[0]])
-            else:
-                tied_hands = [h for i, h in enumerate(sorted_hands) if i in idx]
-                sort_func = functools.partial(compare_hands_of_same_type, jokers)
-                sorted_tied_hands = sorted(tied_hands, key=functools.cmp_to_key(sort_func))
-                final_ranking.extend(sorted_tied_hands)
-    return final_ranking
+    order = np.argsort(-get_hand_keys(hands, jokers), kind="stable")
+    return [hands[i] for i in order]
 
 
 def calculate_hand_winnings(data: List[str], jokers: bool = False) -> int:
     """
-    Determine the total winnings of the hand which is (N - rank) * bid where N is number of hands and rank is the index
-    after sorting with best hand first
+    Determine the total winnings of the hand which is rank * bid where rank is the index after sorting with the worst
+    hand first, starting from 1
 
     :param data: input list of hands and bids
     :param jokers: whether jokers are in the deck
     :return: total winnings
     """
-    hands_dict = {h.split(" ")[0]: int(h.split(" ")[1]) for h in data}
-    ranked_hands = rank_hands(list(hands_dict.keys()), jokers)
-    ms = len(ranked_hands)
-    winnings = [(ms - i) * hands_dict[h] for i, h in enumerate(ranked_hands)]
-    return sum(winnings)
+    hands = [h.split(" ")[0] for h in data]
+    bids = np.array([h.split(" ")[1] for h in data], dtype=np.int64)
+    ranked_bids = bids[np.argsort(get_hand_keys(hands, jokers), kind="stable")]
+    return int((np.arange(1, len(ranked_bids) + 1) * ranked_bids).sum())
 
 
 def solve(data: List[str], part: str = "a") -> int:
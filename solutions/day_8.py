@@ -1,5 +1,228 @@
+from dataclasses import dataclass
 from typing import Dict
 from typing import List
+from typing import Tuple
+
+import numpy as np
+
+
+@dataclass
+class Network:
+    """
+    The node network compiled into integer arrays
+
+    Nodes are identified by their index in names, and left[i] / right[i] give the node reached from node i by an L / R
+    move. The moves are stored as a boolean array which is True for R.
+
+    On creation two tables are built:
+    prefix[r, i] is the node reached from node i after the first r moves, for r from 0 to the number of moves
+    jumps[k, i] is the node reached from node i after 2^k full runs of the moves (binary lifting)
+    Together these give the node reached after any number of steps K in O(log K).
+    """
+
+    names: List[str]
+    left: np.ndarray
+    right: np.ndarray
+    moves: np.ndarray
+
+    def __post_init__(self) -> None:
+        self.index: Dict[str, int] = {name: i for i, name in enumerate(self.names)}
+        self.prefix: np.ndarray = self.get_prefix_table()
+        self.jumps: List[np.ndarray] = [self.prefix[-1]]
+
+    @classmethod
+    def from_mapping(cls, mapping: Dict[str, Dict[str, str]], moves: List[str]) -> "Network":
+        """
+        Compile the mapping dict and moves into a Network
+        :param mapping: mapping dict from create_map()
+        :param moves: moves from get_moves()
+        :return: compiled network
+        """
+        names = list(mapping.keys())
+        index = {name: i for i, name in enumerate(names)}
+        left = np.array([index[mapping[name]["L"]] for name in names], dtype=np.int32)
+        right = np.array([index[mapping[name]["R"]] for name in names], dtype=np.int32)
+        return cls(names, left, right, np.array([m == "R" for m in moves], dtype=bool))
+
+    def get_prefix_table(self) -> np.ndarray:
+        """
+        Follow the moves from every node at once, recording where each node has got to after each move
+        :return: the table of nodes reached after each number of moves from 0 up to a full run of the moves
+        """
+        table = np.empty((len(self.moves) + 1, len(self.names)), dtype=np.int32)
+        table[0] = np.arange(len(self.names))
+        for i, move in enumerate(self.moves):
+            table[i + 1] = (self.right if move else self.left)[table[i]]
+        return table
+
+    def after_runs(self, nodes: np.ndarray, n_runs: int) -> np.ndarray:
+        """
+        Find the nodes reached after n_runs full runs of the moves by combining the binary lifting tables
+        :param nodes: starting node ids
+        :param n_runs: number of full runs of the moves
+        :return: node ids reached
+        """
+        while len(self.jumps) < n_runs.bit_length():
+            self.jumps.append(self.jumps[-1][self.jumps[-1]])
+        for k in range(n_runs.bit_length()):
+            if (n_runs >> k) & 1:
+                nodes = self.jumps[k][nodes]
+        return nodes
+
+    def after(self, nodes: np.ndarray, steps: int) -> np.ndarray:
+        """
+        Find the nodes reached after a number of steps, starting from the first move
+        :param nodes: starting node ids
+        :param steps: number of steps to take
+        :return: node ids reached
+        """
+        n_runs, remainder = divmod(steps, len(self.moves))
+        return self.prefix[remainder][self.after_runs(nodes, n_runs)]
+
+    def first_hits(self, nodes: np.ndarray, targets: np.ndarray) -> np.ndarray:
+        """
+        Find how many steps it takes each starting node to first reach a target node
+
+        All the starting nodes move in lock-step, one full run of the moves at a time. Within a run the prefix table
+        gives every intermediate node, so the first target hit in the run is found without stepping through the moves.
+        If a node reaches the same node at the start of a run twice without hitting a target then it never will, so
+        after as many runs as there are nodes the search gives up.
+        :param nodes: starting node ids
+        :param targets: boolean mask over all node ids which is True for target nodes
+        :return: number of steps to the first target for each starting node
+        """
+        steps = np.full(len(nodes), -1, dtype=np.int64)
+        for run in range(len(self.names) + 1):
+            hits = targets[self.prefix[1:, nodes]]
+            found = hits.any(axis=0) & (steps < 0)
+            steps[found] = run * len(self.moves) + hits[:, found].argmax(axis=0) + 1
+            if np.all(steps >= 0):
+                return steps
+            nodes = self.prefix[-1][nodes]
+        raise ValueError("Some nodes never reach a target node!")
+
+    def get_cycles(self, nodes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the tail and cycle lengths, in steps, of the path from each starting node
+
+        A path is a sequence of (node, move index) states. Looking only at the node at the start of each run of the
+        moves, the path follows the full run map, which is a function on the nodes, so it has a tail of mu runs and
+        then a cycle of lam runs. Both are found in lock-step:
+        - nodes on a cycle of the run map are the nodes reachable after len(names) runs from anywhere
+        - mu is the number of runs until a path first lands on one of these nodes
+        - lam is the number of runs until the path returns to that entry node
+        The state cycle is then lam * len(moves) steps long, and the exact tail in steps is found by comparing the run
+        before the cycle starts with the same run one cycle later - the tail ends at the first step where they merge.
+        :param nodes: starting node ids
+        :return: tail, period for each starting node
+        """
+        full_run = self.prefix[-1]
+        on_cycle = np.zeros(len(self.names), dtype=bool)
+        on_cycle[self.after_runs(np.arange(len(self.names)), len(self.names))] = True
+
+        entry = nodes.copy()
+        before_cycle = nodes.copy()
+        mu = np.zeros(len(nodes), dtype=np.int64)
+        active = ~on_cycle[entry]
+        while np.any(active):
+            before_cycle[active] = entry[active]
+            entry[active] = full_run[entry[active]]
+            mu[active] += 1
+            active = ~on_cycle[entry]
+
+        lam = np.ones(len(nodes), dtype=np.int64)
+        one_cycle_later = entry.copy()
+        current = full_run[entry]
+        active = current != entry
+        while np.any(active):
+            one_cycle_later[active] = current[active]
+            current[active] = full_run[current[active]]
+            lam[active] += 1
+            active = current != entry
+
+        merged = self.prefix[1:, before_cycle] == self.prefix[1:, one_cycle_later]
+        tail = np.where(mu > 0, (mu - 1) * len(self.moves) + merged.argmax(axis=0) + 1, 0)
+        return tail, lam * len(self.moves)
+
+    def get_hits(self, nodes: np.ndarray, targets: np.ndarray, n_runs: np.ndarray) -> List[np.ndarray]:
+        """
+        Find every step at which the path from each starting node is on a target node, over its first n_runs runs
+
+        For each node, the steps within a run starting from it which land on a target are precomputed as a compressed
+        list - the steps for node i are offsets[ptr[i] : ptr[i + 1]]. The paths then advance together one run at a
+        time, expanding the lists for the nodes they are on. A path which starts on a target node is hit at step 0.
+        :param nodes: starting node ids
+        :param targets: boolean mask over all node ids which is True for target nodes
+        :param n_runs: number of runs of the moves to follow for each path
+        :return: sorted target hit steps for each starting node
+        """
+        offsets, hit_nodes = np.nonzero(targets[self.prefix[1:]])
+        order = np.argsort(hit_nodes, kind="stable")
+        ptr = np.searchsorted(hit_nodes[order], np.arange(len(self.names) + 1))
+        offsets = offsets[order] + 1
+
+        ghost_hits: List[np.ndarray] = [np.flatnonzero(targets[nodes])]
+        hit_steps: List[np.ndarray] = [np.zeros(len(ghost_hits[0]), dtype=offsets.dtype)]
+        current = nodes.copy()
+        for run in range(int(n_runs.max())):
+            ghosts = np.flatnonzero(run < n_runs)
+            counts = ptr[current[ghosts] + 1] - ptr[current[ghosts]]
+            rank = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            ghost_hits.append(np.repeat(ghosts, counts))
+            hit_steps.append(run * len(self.moves) + offsets[np.repeat(ptr[current[ghosts]], counts) + rank])
+            current = self.prefix[-1][current]
+
+        all_ghosts = np.concatenate(ghost_hits)
+        order = np.lexsort((np.concatenate(hit_steps), all_ghosts))
+        all_steps = np.concatenate(hit_steps)[order]
+        ghost_ptr = np.searchsorted(all_ghosts[order], np.arange(len(nodes) + 1))
+        return [all_steps[ghost_ptr[i] : ghost_ptr[i + 1]] for i in range(len(nodes))]
+
+    def analyse_cycles(self, nodes: np.ndarray, targets: np.ndarray) -> List["GhostCycle"]:
+        """
+        Find the tail, the cycle and every target hit along the path from each starting node
+        :param nodes: starting node ids
+        :param targets: boolean mask over all node ids which is True for target nodes
+        :return: the cycle analysis for each starting node
+        """
+        tail, period = self.get_cycles(nodes)
+        n_runs = -(-(tail + period) // len(self.moves))
+        cycles = []
+        for t, p, steps in zip(tail.tolist(), period.tolist(), self.get_hits(nodes, targets, n_runs)):
+            cycles.append(
+                GhostCycle(
+                    tail=t,
+                    period=p,
+                    tail_hits=steps[steps < t].tolist(),
+                    cycle_hits=steps[(steps >= t) & (steps < t + p)].tolist(),
+                )
+            )
+        return cycles
+
+
+@dataclass
+class GhostCycle:
+    """
+    The steps at which a path is on a target node
+
+    The path is periodic from step tail onwards with the given period. Before that the target is hit at each of the
+    tail_hits, and from then on at each of the cycle_hits plus any multiple of the period.
+    """
+
+    tail: int
+    period: int
+    tail_hits: List[int]
+    cycle_hits: List[int]
+
+    def is_hit(self, step: int) -> bool:
+        """
+        Check whether the path is on a target node after the given number of steps
+        :param step: number of steps
+        :return: True if on a target node
+        """
+        if step < self.tail:
+            return step in self.tail_hits
+        return (step - self.tail) % self.period + self.tail in self.cycle_hits
 
 
 def create_map(data: List[str]) -> Dict[str, Dict[str, str]]:
@@ -40,28 +263,6 @@ def get_moves(data: List[str]) -> List[str]:
     return list(data[0])
 
 
-def traverse_map(mapping: Dict[str, Dict[str, str]], moves: List[str]) -> int:
-    """
-    Traverse the map by iterating over the moves and following the nodes through the mapping dict
-    :param mapping: mapping dict from create_map()
-    :param moves: moves from get_moves()
-    :return: the number of moves taken to get from start_node to end_node
-    """
-    iterations = 0  # Initialize the iteration counter
-    start_node = "AAA"
-    end_node = "ZZZ"
-    node = start_node
-    while True:
-        move = moves[iterations % len(moves)]
-        node = mapping[node][move]
-
-        iterations += 1
-
-        if node == end_node:
-            break
-    return iterations
-
-
 def gcd(x: int, y: int) -> int:
     """
     Calculate the Greatest Common Divisor (GCD) between two numbers following Euclids algorithm
@@ -103,52 +304,89 @@ def lcm(x: int, y: int) -> int:
     return (x * y) // gcd(x, y)
 
 
-def lcm_of_list(numbers: List[int]) -> int:
+def lift_residues(residues: np.ndarray, modulus: int, period: int, hits: List[int]) -> Tuple[np.ndarray, int]:
     """
-    Calculate the Lowest common multiple of a list of numbers
-    :param numbers: input numbers
-    :return: LCM
+    Combine the steps x = residues (mod modulus) with the steps x = hits (mod period)
+
+    If the period divides the modulus each residue already fixes the step modulo the period, so the residues are just
+    filtered against the hits. Otherwise every residue is lifted to the lcm of the two moduli - x = r + j * modulus
+    for each j below lcm / modulus - and the lifted residues are filtered the same way. Both are a few NumPy
+    operations over all the residues rather than combining each residue with each hit separately. Python ints are
+    used in object arrays if the new modulus could overflow int64.
+
+    Example:
+    residues [1] mod 2 with hits [0, 2] mod 3 -> lifted [1, 3, 5] mod 6 -> [3, 5] mod 6
+    :param residues: allowed steps modulo modulus
+    :param modulus: current modulus
+    :param period: period of the path to combine
+    :param hits: allowed steps modulo period
+    :return: the combined residues and their modulus
     """
-    if len(numbers) == 0:
-        raise ValueError("The list is empty. Please provide a non-empty list of numbers.")
+    new_modulus = lcm(modulus, period)
+    dtype = np.int64 if new_modulus < 2**62 else object
+    if new_modulus != modulus:
+        lifts = np.arange(new_modulus // modulus, dtype=np.int64).astype(dtype) * modulus
+        residues = (residues.astype(dtype)[:, None] + lifts[None, :]).ravel()
+    allowed: np.ndarray = np.array(sorted({h % period for h in hits}), dtype=dtype)
+    return residues[np.isin(residues % period, allowed)], new_modulus
+
 
-    result = numbers[0]
+def combine_cycles(cycles: List[GhostCycle]) -> int:
+    """
+    Find the first step at which every path is on a target node at the same time
+
+    A step before the longest tail must be one of the tail hits of that path, so these are checked directly. After it
+    every path is periodic, so each path allows a set of residues modulo its period and these are combined across the
+    paths with lift_residues() - the Chinese Remainder Theorem done for all residues at once. The answer is then the
+    smallest step after the longest tail which matches one of the combined residues.
+    :param cycles: cycle analysis for each path
+    :return: the first step where all paths are on a target node
+    """
+    longest = max(cycles, key=lambda c: c.tail)
+    for step in longest.tail_hits:
+        if step > 0 and all(c.is_hit(step) for c in cycles):
+            return step
 
-    for num in numbers[1:]:
-        result = lcm(result, num)
+    residues, modulus = np.zeros(1, dtype=np.int64), 1
+    for c in cycles:
+        residues, modulus = lift_residues(residues, modulus, c.period, c.cycle_hits)
+    if len(residues) == 0:
+        raise ValueError("The paths are never all on a target node at the same time!")
 
-    return result
+    start = max(longest.tail, 1)
+    return min(int(a) + (start - int(a) + modulus - 1) // modulus * modulus for a in residues.tolist())
+
+
+def traverse_map(mapping: Dict[str, Dict[str, str]], moves: List[str]) -> int:
+    """
+    Traverse the map by following the moves through the compiled network
+    :param mapping: mapping dict from create_map()
+    :param moves: moves from get_moves()
+    :return: the number of moves taken to get from start_node to end_node
+    """
+    network = Network.from_mapping(mapping, moves)
+    targets = np.array([name == "ZZZ" for name in network.names], dtype=bool)
+    return int(network.first_hits(np.array([network.index["AAA"]]), targets)[0])
 
 
 def traverse_multi_map(mapping: Dict[str, Dict[str, str]], moves: List[str]) -> int:
     """
-    Traverse the map by iterating over the moves and following the nodes through the mapping dict
+    Traverse the map from every start node at once and find the first step where all paths are on an end node
 
-    Once each node reaches a node ending in end_pat, the iteration is logged and the node is removed from the list
-    This logic works on the assumption that once a path hits the end node it then behaves as an oscillator and reaches
-    the same end node again in N steps. So if you find time to hit end node for each start node then the LCM is the
-    number of steps till all nodes simultaneously reach the end node
+    Each path is analysed into a tail followed by a cycle, recording every time it is on an end node, and the paths
+    are then combined exactly with the Chinese Remainder Theorem. This does not rely on the first end node being
+    reached after exactly one cycle length, which is what taking the LCM of the first hits assumes.
 
     :param mapping: mapping dict from create_map()
     :param moves: moves from get_moves()
-    :return: the number of moves taken to get from start_node to end_node
+    :return: the number of moves taken until all paths are on an end node
     """
-    iterations = 0  # Initialize the iteration counter
     start_pat = "A"
     end_pat = "Z"
-    end_steps = []
-    nodes = [node for node in mapping.keys() if node.endswith(start_pat)]
-    while True:
-        move = moves[iterations % len(moves)]
-        nodes = [mapping[node][move] for node in nodes]
-        iterations += 1
-        reached_end = [node.endswith(end_pat) for node in nodes]
-        if any(reached_end):
-            end_steps.append(iterations)
-            nodes = [n for i, n in zip(reached_end, nodes) if not i]
-            if len(nodes) == 0:
-                break
-    return lcm_of_list(end_steps)
+    network = Network.from_mapping(mapping, moves)
+    nodes = np.array([i for i, name in enumerate(network.names) if name.endswith(start_pat)])
+    targets = np.array([name.endswith(end_pat) for name in network.names], dtype=bool)
+    return combine_cycles(network.analyse_cycles(nodes, targets))
 
 
 def solve(data: List[str], part: str = "a") -> int:
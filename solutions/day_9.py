@@ -1,4 +1,8 @@
+import math
+from functools import cache
+from typing import Dict
 from typing import List
+from typing import Tuple
 
 import numpy as np
 
@@ -12,42 +16,103 @@ def get_readings(data: List[str]) -> List[List[int]]:
     return [list(map(int, d.split(" "))) for d in data]
 
 
-def get_gradients(reading: List[int]) -> List[List[int]]:
+def group_readings(readings: List[List[int]]) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
     """
-    Iteratively take the gradient across the values for a reading until all the values are 0
-    :param reading: input reading
-    :return: a list of each gradient
+    Group the readings by length so that each group can be stored as a single 2D matrix
+    :param readings: list of readings for each metric
+    :return: dict mapping length to (row indices in readings, matrix of readings with one row per metric)
     """
-    gradients = []
-    grad = np.array(reading)
-    while not np.all(grad == 0):
-        gradients.append(grad.tolist())
-        grad = np.diff(grad)
-    gradients.append(grad.tolist())
-    gradients.reverse()
-    return gradients
+    lengths = np.array([len(r) for r in readings])
+    groups = {}
+    for length in np.unique(lengths).tolist():
+        idx = np.flatnonzero(lengths == length)
+        groups[length] = (idx, np.array([readings[i] for i in idx], dtype=np.int64).reshape(len(idx), length))
+    return groups
 
 
-def predict_value(gradients: List[List[int]], predict_next: bool = True) -> int:
+def extrapolate(readings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
     """
-    Predict the next measurement by adding the below gradient to the previous number in each gradient
-    :param gradients: input list of gradients
-    :param predict_next: If True then predict next number in sequence, else predict previous
-    :return: gradients with next value predicted
+    Predict the next and previous values for every reading in a matrix at once
+
+    The gradients are taken along the rows of the whole matrix until every gradient is 0. The next value is the sum
+    of the last entries of each gradient and the previous value is the alternating sum of the first entries.
+
+    The matrix is copied transposed into C order so that each position in the readings is a contiguous row. Each
+    gradient is then written into a second buffer of the same size, one row shorter each time, and the two buffers
+    swap - rather than allocating a new matrix per np.diff, or writing over the rows being read.
+
+    Example:
+    [[1, 3, 6, 10]] -> gradients [1, 3, 6, 10], [2, 3, 4], [1, 1], [0]
+    next = 10 + 4 + 1 = 15, previous = 1 - 2 + 1 = 0
+    :param readings: matrix of readings, one row per metric
+    :return: next values, previous values
+    """
+    next_values = np.zeros(len(readings), dtype=np.int64)
+    previous_values = np.zeros(len(readings), dtype=np.int64)
+    sign = 1
+    grad = np.ascontiguousarray(readings.T, dtype=np.int64)
+    scratch = np.empty_like(grad)
+    width = grad.shape[0]
+    while width > 0 and np.any(grad[:width]):
+        next_values += grad[width - 1]
+        previous_values += sign * grad[0]
+        sign = -sign
+        np.subtract(grad[1:width], grad[: width - 1], out=scratch[: width - 1])
+        grad, scratch = scratch, grad
+        width -= 1
+    return next_values, previous_values
+
+
+@cache
+def get_weights(length: int, k: int) -> Tuple[int, ...]:
+    """
+    Get the weights which predict the value k steps beyond a reading of the given length from its values
+
+    The gradient method predicts with the polynomial of degree below length which passes through the readings, so the
+    prediction at position x is a fixed weighted sum of the readings - the Lagrange basis polynomials evaluated at x:
+    w_j = prod_{m != j} (x - m) / (j - m)
+    With integer positions every weight is an integer (a product of binomial coefficients), so this is exact.
+
+    Example:
+    length 3, k = 1 -> x = 3 -> weights (1, -3, 3), the binomial coefficients with alternating signs
+    :param length: number of values in the reading
+    :param k: number of steps to predict forwards from the last value, or backwards from the first value if negative
+    :return: weight for each value in the reading
+    """
+    x = length - 1 + k if k >= 0 else k
+    weights = []
+    for j in range(length):
+        numerator = math.prod(x - m for m in range(length) if m != j)
+        denominator = math.factorial(j) * math.factorial(length - 1 - j) * (-1) ** (length - 1 - j)
+        weights.append(numerator // denominator)
+    return tuple(weights)
+
+
+def predict(readings: List[List[int]], k: int) -> List[int]:
+    """
+    Predict the value k steps forwards (k > 0) or backwards (k < 0) for each reading
+
+    The readings are grouped by length and each group is predicted with a single matrix-vector product against the
+    weights from get_weights(), so predicting any number of steps costs the same as predicting one. If the result
+    could overflow int64 the product is done on object arrays of Python ints instead.
+
+    Example:
+    [[1, 3, 6, 10]] with k = 2 -> 21, with k = -1 -> 0
+    :param readings: list of readings for each metric
+    :param k: number of steps to predict, 0 gives the last value
+    :return: predicted values
     """
-    for i, grad in enumerate(gradients):
-        if i == 0:
-            if predict_next:
-                grad.append(0)
-            else:
-                grad.insert(0, 0)
+    predictions = [0] * len(readings)
+    for length, (idx, matrix) in group_readings(readings).items():
+        weights = get_weights(length, k)
+        bound = max(abs(w) for w in weights) * int(np.abs(matrix).max(initial=0)) * length
+        if bound < 2**63:
+            values = (matrix @ np.array(weights, dtype=np.int64)).tolist()
         else:
-            if predict_next:
-                grad.append(grad[-1] + gradients[i - 1][-1])
-            else:
-                grad.insert(0, grad[0] - gradients[i - 1][0])
-    idx = -1 if predict_next else 0
-    return gradients[-1][idx]
+            values = np.dot(matrix.astype(object), np.array(weights, dtype=object)).tolist()
+        for i, value in zip(idx.tolist(), values):
+            predictions[i] = value
+    return predictions
 
 
 def predict_next_values(data: List[str], predict_next: bool = True) -> List[int]:
@@ -58,7 +123,11 @@ def predict_next_values(data: List[str], predict_next: bool = True) -> List[int]
     :return: predicted values
     """
     readings = get_readings(data)
-    return [predict_value(get_gradients(reading), predict_next) for reading in readings]
+    predictions = np.zeros(len(readings), dtype=np.int64)
+    for idx, matrix in group_readings(readings).values():
+        next_values, previous_values = extrapolate(matrix)
+        predictions[idx] = next_values if predict_next else previous_values
+    return predictions.tolist()
 
 
 def solve(data: List[str], part: str = "a") -> int: